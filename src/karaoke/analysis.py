@@ -0,0 +1,440 @@
+from __future__ import annotations
+
+import multiprocessing as mp
+import queue
+import time
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .capture import BlockRing
+from .clock import SongClock
+from .config import AudioConfig, NoteTrackingConfig
+from .features import FrameFeatures
+from .frames import FrameAssembler, create_frame_assembler
+from .governor import CHEAP_BACKEND, LEVELS, QualityLevel
+from .pitch import PitchBackend, PitchEstimate, create_pitch_estimator
+from .profiling import StageTimes
+from .telemetry import LatencyTelemetry
+from .tracking import NoteTracker, UserNote
+
+# (notas por canal, amostras de latencia, ADC do bloco mais novo que fechou nota, tempos por etapa)
+_Batch = Tuple[List[List[UserNote]], List[Tuple[str, float]], float, Optional[StageTimes]]
+
+_SYNC_SONG = 0
+_SYNC_HOST = 1
+_SYNC_SEQ = 2
+_STOP = 3
+_SONG_TIME = 4
+_CLOCK_ERROR = 5
+_FINISH_SEQ = 6
+_SKIP_SILENT = 7
+_CHEAP_PITCH = 8
+# Instante (perf_counter) do play: blocos com ADC anterior sao descartados; inf entre musicas.
+_BEGIN = 9
+# Depois dos campos fixos vem um par (hz, confianca) por canal.
+_PITCH_BASE = 10
+
+WORKER_IDLE_S = 0.002
+WORKER_JOIN_S = 5.0
+# Com skip_silent, janelas abaixo desta fracao do limiar de energia do tracker nem passam pelo pitch.
+SILENT_MARGIN = 0.5
+
+
+class LocalAnalysis:
+    def __init__(
+        self,
+        audio_cfg: AudioConfig,
+        tracking_cfg: NoteTrackingConfig,
+        telemetry: Optional[LatencyTelemetry] = None,
+        timings: Optional[StageTimes] = None,
+    ):
+        self.audio_cfg = audio_cfg
+        self.tracking_cfg = tracking_cfg
+        self.ring = BlockRing(audio_cfg.ring_blocks, audio_cfg.block_size, audio_cfg.channels, audio_cfg.sample_rate)
+        self.ring.pause()
+        self.estimator = create_pitch_estimator(audio_cfg)
+        self.cheap_estimator = _cheap_estimator(audio_cfg, self.estimator)
+        self.features = FrameFeatures(size=audio_cfg.window_size or audio_cfg.block_size)
+        self.telemetry = telemetry
+        self.timings = timings
+        self.notes_adc = 0.0
+        self.quality = LEVELS[0]
+        self._reset()
+
+    @property
+    def song_time(self) -> float:
+        return self.clock.time_s
+
+    @property
+    def clock_error_s(self) -> float:
+        return self.clock.error_s
+
+    def sync(self, song_time_s: float, host_time_s: float) -> None:
+        self.clock.observe(host_time_s, song_time_s)
+
+    def set_quality(self, level: QualityLevel) -> None:
+        self.quality = level
+        self.assembler.set_overlap(not level.cheap_pitch)
+
+    def begin(self, playback_start: float) -> None:
+        # Blocos gravados enquanto a musica era preparada nao pertencem a ela.
+        self.ring.resume()
+        self.ring.discard_before(playback_start)
+
+    def poll(self) -> List[List[UserNote]]:
+        samples: Optional[List[Tuple[str, float]]] = [] if self.telemetry is not None else None
+        estimator = self.cheap_estimator if self.quality.cheap_pitch else self.estimator
+        notes, estimate, self.notes_adc = _drain(
+            self.ring,
+            self.clock,
+            self.assembler,
+            self.features,
+            estimator,
+            self.trackers,
+            samples,
+            self.quality.skip_silent,
+            self.timings,
+        )
+        if estimate is not None:
+            self.pitches = _estimates(*estimate)
+        if samples:
+            self.telemetry.record_many(samples)
+        return notes
+
+    def flush(self) -> List[List[UserNote]]:
+        # Fecha as notas da musica atual e zera relogio/notas para a proxima.
+        notes = self.poll()
+        for channel_notes, tracker in zip(notes, self.trackers):
+            channel_notes.extend(tracker.flush())
+        self.ring.pause()
+        self._reset()
+        return notes
+
+    def close(self) -> None:
+        pass
+
+    def _reset(self) -> None:
+        self.clock = SongClock(self.audio_cfg.sample_rate, self.audio_cfg.output_latency_s)
+        self.assembler = create_frame_assembler(self.audio_cfg)
+        self.assembler.set_overlap(not self.quality.cheap_pitch)
+        self.trackers = [NoteTracker(self.tracking_cfg) for _ in range(self.audio_cfg.channels)]
+        self.pitches = [PitchEstimate(None, 0.0) for _ in range(self.audio_cfg.channels)]
+
+
+class ProcessAnalysis:
+    def __init__(
+        self,
+        audio_cfg: AudioConfig,
+        tracking_cfg: NoteTrackingConfig,
+        telemetry: Optional[LatencyTelemetry] = None,
+        timings: Optional[StageTimes] = None,
+    ):
+        self.channels = audio_cfg.channels
+        self.telemetry = telemetry
+        self.timings = timings
+        self.notes_adc = 0.0
+        ring_bytes = BlockRing.nbytes(audio_cfg.ring_blocks, audio_cfg.block_size, audio_cfg.channels)
+        slots = _control_slots(audio_cfg.channels)
+        self._shm = shared_memory.SharedMemory(create=True, size=ring_bytes + 8 * slots)
+        self.ring = BlockRing(
+            audio_cfg.ring_blocks,
+            audio_cfg.block_size,
+            audio_cfg.channels,
+            audio_cfg.sample_rate,
+            buffer=self._shm.buf,
+        )
+        # O callback roda neste processo: a pausa vale para este objeto, nao para o do worker.
+        self.ring.pause()
+        self._control = np.ndarray((slots,), dtype=np.float64, buffer=self._shm.buf, offset=ring_bytes)
+        self._control[_PITCH_BASE::2] = np.nan
+        self._control[_CLOCK_ERROR] = np.inf
+        self._control[_BEGIN] = np.inf
+
+        context = mp.get_context("spawn")
+        self._notes: "mp.Queue[Optional[_Batch]]" = context.Queue()
+        self._process = context.Process(
+            target=_worker_main,
+            args=(
+                self._shm.name,
+                ring_bytes,
+                audio_cfg,
+                tracking_cfg,
+                self._notes,
+                telemetry is not None,
+                timings is not None,
+            ),
+            name="karaoke-analysis",
+            daemon=True,
+        )
+        self._process.start()
+
+    @property
+    def song_time(self) -> float:
+        return float(self._control[_SONG_TIME])
+
+    @property
+    def pitches(self) -> List[PitchEstimate]:
+        return _estimates(self._control[_PITCH_BASE::2], self._control[_PITCH_BASE + 1 :: 2])
+
+    @property
+    def clock_error_s(self) -> float:
+        return float(self._control[_CLOCK_ERROR])
+
+    def sync(self, song_time_s: float, host_time_s: float) -> None:
+        # Seqlock: numero impar enquanto o par esta sendo escrito.
+        self._control[_SYNC_SEQ] += 1.0
+        self._control[_SYNC_SONG] = song_time_s
+        self._control[_SYNC_HOST] = host_time_s
+        self._control[_SYNC_SEQ] += 1.0
+
+    def set_quality(self, level: QualityLevel) -> None:
+        self._control[_SKIP_SILENT] = float(level.skip_silent)
+        self._control[_CHEAP_PITCH] = float(level.cheap_pitch)
+
+    def begin(self, playback_start: float) -> None:
+        # O worker e quem le o ring (SPSC): so avisa a partir de quando os blocos valem.
+        self._control[_BEGIN] = playback_start
+        self.ring.resume()
+
+    def poll(self) -> List[List[UserNote]]:
+        notes = _empty(self.channels)
+        self.notes_adc = 0.0
+        while True:
+            try:
+                batch = self._notes.get_nowait()
+            except queue.Empty:
+                break
+            if batch:
+                self._receive(notes, batch)
+        if not any(notes) and not self._process.is_alive():
+            raise RuntimeError("Processo de analise terminou inesperadamente.")
+        return notes
+
+    def flush(self) -> List[List[UserNote]]:
+        # O worker fecha as notas, manda o marcador None e continua com relogio/notas zerados.
+        self.ring.pause()
+        self._control[_FINISH_SEQ] += 1.0
+        notes = _empty(self.channels)
+        deadline = time.monotonic() + WORKER_JOIN_S
+        while time.monotonic() < deadline:
+            try:
+                batch = self._notes.get(timeout=0.1)
+            except queue.Empty:
+                if not self._process.is_alive():
+                    break
+                continue
+            if batch is None:
+                break
+            self._receive(notes, batch)
+        return notes
+
+    def _receive(self, notes: List[List[UserNote]], batch: _Batch) -> None:
+        channel_notes, samples, notes_adc, timings = batch
+        for output, items in zip(notes, channel_notes):
+            output.extend(items)
+        self.notes_adc = max(self.notes_adc, notes_adc)
+        if self.telemetry is not None:
+            self.telemetry.record_many(samples)
+        if self.timings is not None and timings is not None:
+            self.timings.merge(timings)
+
+    def close(self) -> None:
+        if self._process.is_alive():
+            self._control[_STOP] = 1.0
+            self._process.join(WORKER_JOIN_S)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        self._notes.close()
+        self.ring.release()
+        self._control = None
+        self._shm.close()
+        self._shm.unlink()
+
+
+def _worker_main(
+    shm_name: str,
+    ring_bytes: int,
+    audio_cfg: AudioConfig,
+    tracking_cfg: NoteTrackingConfig,
+    notes_out: "mp.Queue[Optional[_Batch]]",
+    measure: bool = False,
+    profile: bool = False,
+) -> None:
+    shm = shared_memory.SharedMemory(name=shm_name)
+    ring = BlockRing(
+        audio_cfg.ring_blocks,
+        audio_cfg.block_size,
+        audio_cfg.channels,
+        audio_cfg.sample_rate,
+        buffer=shm.buf,
+    )
+    control = np.ndarray((_control_slots(audio_cfg.channels),), dtype=np.float64, buffer=shm.buf, offset=ring_bytes)
+    clock = SongClock(audio_cfg.sample_rate, audio_cfg.output_latency_s)
+    assembler = create_frame_assembler(audio_cfg)
+    estimator = create_pitch_estimator(audio_cfg)
+    cheap_estimator = _cheap_estimator(audio_cfg, estimator)
+    features = FrameFeatures(size=audio_cfg.window_size or audio_cfg.block_size)
+    trackers = [NoteTracker(tracking_cfg) for _ in range(audio_cfg.channels)]
+    timings = StageTimes() if profile else None
+    seen_sync = 0.0
+    seen_finish = 0.0
+
+    try:
+        while True:
+            stopping = bool(control[_STOP])
+            finish_seq = float(control[_FINISH_SEQ])
+            sync_seq = float(control[_SYNC_SEQ])
+            if sync_seq != seen_sync and sync_seq % 2.0 == 0.0:
+                song_time_s = float(control[_SYNC_SONG])
+                host_time_s = float(control[_SYNC_HOST])
+                # Descarta o par se o processo principal escreveu outro no meio da leitura.
+                if float(control[_SYNC_SEQ]) == sync_seq:
+                    seen_sync = sync_seq
+                    clock.observe(host_time_s, song_time_s)
+
+            ring.discard_before(float(control[_BEGIN]))
+            cheap = bool(control[_CHEAP_PITCH])
+            assembler.set_overlap(not cheap)
+            samples: Optional[List[Tuple[str, float]]] = [] if measure else None
+            notes, estimate, notes_adc = _drain(
+                ring,
+                clock,
+                assembler,
+                features,
+                cheap_estimator if cheap else estimator,
+                trackers,
+                samples,
+                bool(control[_SKIP_SILENT]),
+                timings,
+            )
+            control[_SONG_TIME] = clock.time_s
+            control[_CLOCK_ERROR] = clock.error_s
+            if estimate is not None:
+                control[_PITCH_BASE::2], control[_PITCH_BASE + 1 :: 2] = estimate
+
+            if stopping or finish_seq != seen_finish:
+                for channel_notes, tracker in zip(notes, trackers):
+                    channel_notes.extend(tracker.flush())
+                # Ate o proximo begin() tudo que chega e de antes da musica; o marcador None abaixo
+                # garante que o begin() do processo principal vem depois desta escrita.
+                control[_BEGIN] = np.inf
+                notes_out.put((notes, samples or [], notes_adc, timings or None))
+                notes_out.put(None)
+                if stopping:
+                    break
+                seen_finish = finish_seq
+                clock = SongClock(audio_cfg.sample_rate, audio_cfg.output_latency_s)
+                assembler = create_frame_assembler(audio_cfg)
+                trackers = [NoteTracker(tracking_cfg) for _ in range(audio_cfg.channels)]
+                timings = StageTimes() if profile else None
+                continue
+            if any(notes) or samples or timings:
+                notes_out.put((notes, samples or [], notes_adc, timings or None))
+                # A fila serializa depois, em outra thread: cada lote leva um objeto proprio.
+                timings = StageTimes() if profile else None
+            elif estimate is None:
+                time.sleep(WORKER_IDLE_S)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ring.release()
+        del control
+        shm.close()
+
+
+def _drain(
+    ring: BlockRing,
+    clock: SongClock,
+    assembler: FrameAssembler,
+    features: FrameFeatures,
+    estimator: PitchBackend,
+    trackers: List[NoteTracker],
+    samples: Optional[List[Tuple[str, float]]] = None,
+    skip_silent: bool = False,
+    timings: Optional[StageTimes] = None,
+) -> Tuple[List[List[UserNote]], Optional[Tuple[np.ndarray, np.ndarray]], float]:
+    notes = _empty(len(trackers))
+    estimate: Optional[Tuple[np.ndarray, np.ndarray]] = None
+    notes_adc = 0.0
+    while True:
+        item = ring.read()
+        if item is None:
+            break
+        frame, lost_frames = item
+        if lost_frames:
+            clock.skip(lost_frames)
+            assembler.reset()
+        adc = ring.last_adc
+        if samples is not None:
+            samples.append(("callback", ring.last_arrival - adc))
+            samples.append(("fila", time.perf_counter() - adc))
+        mark = time.perf_counter() if timings is not None else 0.0
+        assembler.push(frame, clock.advance(len(frame), adc))
+        ready = assembler.take()
+        if ready is None:
+            if timings is not None:
+                timings.lap("janelas", mark)
+            continue
+        times, windows = ready
+        count, channels, _ = windows.shape
+        # Uma passada pelas amostras (sem DC, RMS, pico) serve ao pitch e ao tracker; um FFT em lote
+        # para todas as janelas deste bloco e todos os canais (um cantor por canal).
+        features.compute(windows)
+        rows = _loud_rows(features, trackers) if skip_silent else None
+        if timings is not None:
+            mark = timings.lap("janelas", mark)
+        hz, confidence = estimator.estimate_features(features, rows)
+        hz = hz.reshape(count, channels)
+        estimate = hz[-1], confidence.reshape(count, channels)[-1]
+        if samples is not None:
+            samples.append(("pitch", time.perf_counter() - adc))
+        if timings is not None:
+            mark = timings.lap("pitch", mark)
+        finished = False
+        levels = features.rms.reshape(count, channels).tolist()
+        for frame_time, window_rms, window_hz in zip(times.tolist(), levels, hz.tolist()):
+            for channel, tracker in enumerate(trackers):
+                value = window_hz[channel]
+                closed = tracker.process_rms(frame_time, window_rms[channel], None if np.isnan(value) else value)
+                if closed:
+                    notes[channel].extend(closed)
+                    finished = True
+        if timings is not None:
+            timings.lap("notas", mark)
+        if finished:
+            notes_adc = adc
+            if samples is not None:
+                samples.append(("nota", time.perf_counter() - adc))
+    return notes, estimate, notes_adc
+
+
+def _loud_rows(features: FrameFeatures, trackers: List[NoteTracker]) -> np.ndarray:
+    # Janelas que o tracker vai tratar como silencio nao precisam de pitch.
+    thresholds = np.array([tracker.threshold for tracker in trackers], dtype=np.float32)
+    levels = features.rms.reshape(-1, len(trackers))
+    return np.flatnonzero(levels >= SILENT_MARGIN * thresholds)
+
+
+def _cheap_estimator(audio_cfg: AudioConfig, estimator: PitchBackend) -> PitchBackend:
+    if estimator.name == CHEAP_BACKEND:
+        return estimator
+    return create_pitch_estimator(audio_cfg, CHEAP_BACKEND)
+
+
+def _estimates(hz: np.ndarray, confidence: np.ndarray) -> List[PitchEstimate]:
+    return [
+        PitchEstimate(None if np.isnan(value) else value, conf)
+        for value, conf in zip(hz.tolist(), confidence.tolist())
+    ]
+
+
+def _control_slots(channels: int) -> int:
+    return _PITCH_BASE + 2 * channels
+
+
+def _empty(channels: int) -> List[List[UserNote]]:
+    return [[] for _ in range(channels)]
+
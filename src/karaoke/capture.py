@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+class BlockRing:
+    def __init__(
+        self,
+        capacity: int,
+        block_size: int,
+        channels: int,
+        sample_rate: int,
+        buffer: Optional[memoryview] = None,
+    ):
+        self.capacity = capacity
+        self.block_size = block_size
+        self.channels = channels
+        self.sample_rate = sample_rate
+        if buffer is None:
+            buffer = memoryview(bytearray(self.nbytes(capacity, block_size, channels)))
+        # Indices de escrita/leitura ficam no proprio buffer para funcionar em memoria compartilhada.
+        self._state = np.ndarray((2,), dtype=np.int64, buffer=buffer)
+        self._frames = np.ndarray((capacity,), dtype=np.int64, buffer=buffer, offset=16)
+        self._gaps = np.ndarray((capacity,), dtype=np.int64, buffer=buffer, offset=16 + 8 * capacity)
+        # Instante do ADC e da chegada no callback, em time.perf_counter() (monotonico entre processos).
+        self._stamps = np.ndarray((capacity, 2), dtype=np.float64, buffer=buffer, offset=16 + 16 * capacity)
+        self._data = np.ndarray(
+            (capacity, block_size, channels),
+            dtype=np.float32,
+            buffer=buffer,
+            offset=16 + 32 * capacity,
+        )
+        self._out = np.zeros((block_size, channels), dtype=np.float32)
+
+        self._pending_gap = 0
+        self._next_adc_time: Optional[float] = None
+        self._paused = False
+        self.last_adc = 0.0
+        self.last_arrival = 0.0
+        self.overruns = 0
+        self.overflows = 0
+        self.underflows = 0
+        self.dropped_frames = 0
+
+    @staticmethod
+    def nbytes(capacity: int, block_size: int, channels: int) -> int:
+        return 16 + 32 * capacity + 4 * capacity * block_size * channels
+
+    def __len__(self) -> int:
+        return int(self._state[0] - self._state[1])
+
+    @property
+    def read_count(self) -> int:
+        return int(self._state[1])
+
+    def pause(self) -> None:
+        # Fora de uma musica ninguem le o ring: os blocos sao ignorados sem contar como perda.
+        self._paused = True
+
+    def resume(self) -> None:
+        self._paused = False
+
+    def callback(self, indata: np.ndarray, frames: int, time_info, status) -> None:
+        arrival = time.perf_counter()
+        if self._paused:
+            # So a thread do callback mexe nestes campos; o primeiro bloco depois de resume() nao traz lacuna.
+            self._pending_gap = 0
+            self._next_adc_time = None
+            return
+        if status:
+            if status.input_overflow:
+                self.overflows += 1
+            if status.input_underflow:
+                self.underflows += 1
+        self._pending_gap += self._lost_before(frames, time_info)
+
+        write = int(self._state[0])
+        if write - int(self._state[1]) >= self.capacity:
+            self.overruns += 1
+            self.dropped_frames += frames
+            self._pending_gap += frames
+            return
+
+        slot = write % self.capacity
+        frames = min(frames, self.block_size)
+        np.copyto(self._data[slot, :frames], indata[:frames])
+        self._frames[slot] = frames
+        self._gaps[slot] = self._pending_gap
+        self._stamps[slot] = (arrival - _callback_age(time_info), arrival)
+        self._pending_gap = 0
+        self._state[0] = write + 1
+
+    def read(self) -> Optional[Tuple[np.ndarray, int]]:
+        read = int(self._state[1])
+        if read == int(self._state[0]):
+            return None
+        slot = read % self.capacity
+        frames = int(self._frames[slot])
+        gap = int(self._gaps[slot])
+        self.last_adc, self.last_arrival = self._stamps[slot].tolist()
+        np.copyto(self._out[:frames], self._data[slot, :frames])
+        self._state[1] = read + 1
+        return self._out[:frames], gap
+
+    def discard_before(self, adc_time: float) -> int:
+        # Lado do consumidor: pula blocos cujo ADC e anterior a adc_time.
+        read = int(self._state[1])
+        write = int(self._state[0])
+        start = read
+        while read < write and self._stamps[read % self.capacity, 0] < adc_time:
+            read += 1
+        if read != start:
+            self._state[1] = read
+        return read - start
+
+    def release(self) -> None:
+        self._state = self._frames = self._gaps = self._stamps = self._data = None
+
+    def _lost_before(self, frames: int, time_info) -> int:
+        # Usa o relogio do ADC para medir amostras perdidas antes deste bloco.
+        adc_time = float(getattr(time_info, "inputBufferAdcTime", 0.0) or 0.0)
+        if adc_time <= 0.0:
+            return 0
+        expected = self._next_adc_time
+        self._next_adc_time = adc_time + frames / self.sample_rate
+        if expected is None:
+            return 0
+        lost = int(round((adc_time - expected) * self.sample_rate))
+        if lost < frames // 2:
+            return 0
+        self.dropped_frames += lost
+        return lost
+
+
+def _callback_age(time_info) -> float:
+    adc_time = float(getattr(time_info, "inputBufferAdcTime", 0.0) or 0.0)
+    current = float(getattr(time_info, "currentTime", 0.0) or 0.0)
+    if adc_time <= 0.0 or current <= 0.0:
+        return 0.0
+    return max(current - adc_time, 0.0)
@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import argparse
+import difflib
+import os
+import sqlite3
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .song import Song
+
+CATALOG_NAME = ".catalog.sqlite3"
+SIGNATURE_FILES = ("melody.csv", "melody_p2.csv", "lyrics.lrc", "meta.json", "audio.wav", "audio.ogg", "audio.mp3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (
+    path TEXT PRIMARY KEY,
+    signature TEXT NOT NULL,
+    title TEXT NOT NULL,
+    artist TEXT,
+    title_key TEXT NOT NULL,
+    artist_key TEXT NOT NULL,
+    duration_s REAL NOT NULL,
+    note_count INTEGER NOT NULL,
+    audio_path TEXT NOT NULL,
+    lyrics_path TEXT NOT NULL,
+    melody_path TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS songs_title_key ON songs (title_key);
+CREATE INDEX IF NOT EXISTS songs_artist_key ON songs (artist_key);
+CREATE TABLE IF NOT EXISTS failures (
+    path TEXT PRIMARY KEY,
+    signature TEXT NOT NULL
+);
+"""
+
+_COLUMNS = "path, title, artist, duration_s, note_count, audio_path, lyrics_path, melody_path"
+
+
+@dataclass
+class CatalogEntry:
+    path: Path
+    title: str
+    artist: Optional[str]
+    duration_s: float
+    note_count: int
+    audio_path: Path
+    lyrics_path: Path
+    melody_path: Path
+
+
+@dataclass
+class RefreshStats:
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    unchanged: int = 0
+    failed: int = 0
+
+
+class Catalog:
+    def __init__(self, root: Path, db_path: Optional[Path] = None):
+        self.root = root
+        self.db_path = db_path or root / CATALOG_NAME
+        self._conn = sqlite3.connect(str(self.db_path))
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "Catalog":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def refresh(self) -> RefreshStats:
+        stats = RefreshStats()
+        known: Dict[str, str] = dict(self._conn.execute("SELECT path, signature FROM songs"))
+        failures: Dict[str, str] = dict(self._conn.execute("SELECT path, signature FROM failures"))
+        seen = set()
+
+        with self._conn:
+            for song_dir, signature in _scan(self.root):
+                key = song_dir.relative_to(self.root).as_posix()
+                seen.add(key)
+                previous = known.get(key)
+                if previous == signature:
+                    stats.unchanged += 1
+                    continue
+                if failures.get(key) == signature:
+                    stats.failed += 1
+                    continue
+                try:
+                    song = Song.from_dir(song_dir)
+                except (OSError, ValueError, KeyError) as exc:
+                    print(f"Falha ao catalogar {song_dir}: {exc}")
+                    stats.failed += 1
+                    self._conn.execute("DELETE FROM songs WHERE path = ?", (key,))
+                    self._conn.execute("INSERT OR REPLACE INTO failures VALUES (?, ?)", (key, signature))
+                    continue
+                self._conn.execute("DELETE FROM failures WHERE path = ?", (key,))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO songs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    self._row(key, signature, song),
+                )
+                if previous is None:
+                    stats.added += 1
+                else:
+                    stats.updated += 1
+
+            gone = [(key,) for key in known if key not in seen]
+            self._conn.executemany("DELETE FROM songs WHERE path = ?", gone)
+            self._conn.executemany("DELETE FROM failures WHERE path = ?", [(key,) for key in failures if key not in seen])
+            stats.removed = len(gone)
+        return stats
+
+    def all(self) -> List[CatalogEntry]:
+        rows = self._conn.execute(f"SELECT {_COLUMNS} FROM songs ORDER BY title_key, artist_key")
+        return [self._entry(row) for row in rows]
+
+    def search(self, query: str, limit: int = 20) -> List[CatalogEntry]:
+        key = _normalize(query)
+        if not key:
+            return self.all()[:limit]
+        prefix = _escape_like(key) + "%"
+        word = "% " + prefix
+        rows = self._conn.execute(
+            f"SELECT {_COLUMNS} FROM songs "
+            "WHERE title_key LIKE ? ESCAPE '\\' OR artist_key LIKE ? ESCAPE '\\' "
+            "OR title_key LIKE ? ESCAPE '\\' OR artist_key LIKE ? ESCAPE '\\' "
+            "ORDER BY (title_key LIKE ? ESCAPE '\\') DESC, title_key LIMIT ?",
+            (prefix, prefix, word, word, prefix, limit),
+        )
+        return [self._entry(row) for row in rows]
+
+    def fuzzy(self, query: str, limit: int = 20, cutoff: float = 0.5) -> List[CatalogEntry]:
+        key = _normalize(query)
+        if not key:
+            return []
+        matcher = difflib.SequenceMatcher(autojunk=False)
+        matcher.set_seq2(key)
+        scored: List[Tuple[float, tuple]] = []
+        rows = self._conn.execute(f"SELECT {_COLUMNS}, title_key, artist_key FROM songs")
+        for row in rows:
+            best = 0.0
+            for text in (row[-2], row[-1], f"{row[-2]} {row[-1]}".strip()):
+                if not text:
+                    continue
+                matcher.set_seq1(text)
+                if matcher.real_quick_ratio() < cutoff or matcher.quick_ratio() < cutoff:
+                    continue
+                best = max(best, matcher.ratio())
+            for text in (row[-2], row[-1]):
+                if text and key in text:
+                    best = max(best, 0.9)
+            if best >= cutoff:
+                scored.append((best, row[:-2]))
+        scored.sort(key=lambda item: (-item[0], item[1][1]))
+        return [self._entry(row) for _, row in scored[:limit]]
+
+    def _row(self, key: str, signature: str, song: Song) -> tuple:
+        melody = song.melody
+        duration_s = float(melody.end_s.max()) if len(melody) else 0.0
+        return (
+            key,
+            signature,
+            song.title,
+            song.artist,
+            _normalize(song.title),
+            _normalize(song.artist or ""),
+            duration_s,
+            len(melody),
+            song.audio_path.name,
+            "lyrics.lrc",
+            "melody.csv",
+        )
+
+    def _entry(self, row: tuple) -> CatalogEntry:
+        path = self.root / row[0]
+        return CatalogEntry(
+            path=path,
+            title=row[1],
+            artist=row[2] or None,
+            duration_s=row[3],
+            note_count=row[4],
+            audio_path=path / row[5],
+            lyrics_path=path / row[6],
+            melody_path=path / row[7],
+        )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Catalogo das musicas em songs/.")
+    parser.add_argument("query", nargs="?", help="Busca por prefixo no titulo/artista")
+    parser.add_argument("--root", default="songs", help="Pasta raiz das musicas")
+    parser.add_argument("--db", help="Arquivo do catalogo (padrao: <root>/.catalog.sqlite3)")
+    parser.add_argument("--no-refresh", action="store_true", help="Nao reescaneia as pastas")
+    parser.add_argument("--fuzzy", action="store_true", help="Busca aproximada")
+    parser.add_argument("--limit", type=int, default=20, help="Maximo de resultados")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    root = Path(args.root)
+    with Catalog(root, Path(args.db) if args.db else None) as catalog:
+        if not args.no_refresh:
+            stats = catalog.refresh()
+            print(
+                f"Catalogo: {stats.added} novas, {stats.updated} atualizadas, {stats.removed} removidas, "
+                f"{stats.unchanged} sem mudanca, {stats.failed} falhas"
+            )
+        if args.query is None:
+            entries = catalog.all()[: args.limit]
+        elif args.fuzzy:
+            entries = catalog.fuzzy(args.query, args.limit)
+        else:
+            entries = catalog.search(args.query, args.limit)
+        for entry in entries:
+            artist = f" - {entry.artist}" if entry.artist else ""
+            minutes, seconds = divmod(int(entry.duration_s), 60)
+            print(f"{entry.title}{artist} [{minutes}:{seconds:02d}, {entry.note_count} notas] {entry.path}")
+    return 0
+
+
+def _scan(root: Path) -> Iterator[Tuple[Path, str]]:
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(name for name in dirnames if not name.startswith("."))
+        if "melody.csv" not in filenames:
+            continue
+        names = set(filenames)
+        parts = []
+        for name in SIGNATURE_FILES:
+            if name in names:
+                parts.append(f"{name}={os.stat(os.path.join(dirpath, name)).st_mtime_ns}")
+        yield Path(dirpath), ";".join(parts)
+
+
+def _normalize(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(stripped.lower().split())
+
+
+def _escape_like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import math
+from typing import Optional
+
+import numpy as np
+
+FIT_WINDOW = 512
+FIT_MIN_SPACING_S = 0.05
+FIT_MIN_SPAN_S = 2.0
+MAX_DRIFT = 0.005
+SLEW = 0.5
+
+
+class SongClock:
+    def __init__(self, sample_rate: int, output_latency_s: float = 0.0):
+        self.sample_rate = sample_rate
+        self.output_latency_s = output_latency_s
+        self.time_s = 0.0
+        self.error_s = math.inf
+        # Pontos (tempo do host, tempo da musica) para o ajuste linear.
+        self._host = np.zeros(FIT_WINDOW, dtype=np.float64)
+        self._song = np.zeros(FIT_WINDOW, dtype=np.float64)
+        self._count = 0
+        self._slope = 1.0
+        self._intercept: Optional[float] = None
+        self._origin = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self._intercept is not None
+
+    def observe(self, host_time_s: float, song_time_s: float) -> None:
+        # Posicao do mixer fica a frente do que sai no alto-falante pela latencia de saida.
+        song_time_s -= self.output_latency_s
+        if song_time_s <= 0.0:
+            return
+        if self._count and host_time_s - self._host[(self._count - 1) % FIT_WINDOW] < FIT_MIN_SPACING_S:
+            return
+        if not self._count:
+            self._origin = host_time_s
+        slot = self._count % FIT_WINDOW
+        self._host[slot] = host_time_s
+        self._song[slot] = song_time_s
+        self._count += 1
+        self._fit()
+
+    def at(self, host_time_s: float) -> Optional[float]:
+        if self._intercept is None:
+            return None
+        return self._intercept + self._slope * (host_time_s - self._origin)
+
+    def advance(self, frames: int, adc_time_s: float = 0.0) -> float:
+        current = self.time_s
+        step = frames / self.sample_rate
+        predicted = self.at(adc_time_s) if adc_time_s > 0.0 else None
+        if predicted is not None:
+            if predicted >= current:
+                current = predicted
+            else:
+                # Nunca volta no tempo (a pontuacao exige notas em ordem): anda mais devagar ate o ajuste alcancar.
+                step *= SLEW
+        self.time_s = current + step
+        return current
+
+    def skip(self, frames: int) -> None:
+        # Blocos perdidos so precisam ser contados enquanto nao ha ajuste.
+        if not self.ready:
+            self.time_s += frames / self.sample_rate
+
+    def _fit(self) -> None:
+        count = min(self._count, FIT_WINDOW)
+        x = self._host[:count] - self._origin
+        y = self._song[:count]
+        span = float(x.max() - x.min())
+        if count < 3 or span < FIT_MIN_SPAN_S:
+            slope = 1.0
+        else:
+            x_mean = float(x.mean())
+            dx = x - x_mean
+            slope = float(np.dot(dx, y - y.mean()) / np.dot(dx, dx))
+            slope = min(max(slope, 1.0 - MAX_DRIFT), 1.0 + MAX_DRIFT)
+        intercept = float(np.mean(y - slope * x))
+        self._slope = slope
+        self._intercept = intercept
+
+        residual = y - (intercept + slope * x)
+        if count < 3:
+            self.error_s = math.inf
+            return
+        sigma = math.sqrt(float(np.dot(residual, residual)) / (count - 2))
+        dx = x - x.mean()
+        sxx = float(np.dot(dx, dx))
+        latest = float(x[(self._count - 1) % FIT_WINDOW] - x.mean())
+        leverage = 1.0 / count + (latest * latest / sxx if sxx > 0.0 else 0.0)
+        self.error_s = sigma * math.sqrt(leverage)
@@ -6,9 +6,17 @@ class AudioConfig:
     sample_rate: int = 44100
     block_size: int = 1024
     channels: int = 1
+    ring_blocks: int = 64
     min_freq: float = 80.0
     max_freq: float = 900.0
     corr_threshold: float = 0.35
+    pitch_backend: str = "autocorr"
+    yin_threshold: float = 0.15
+    mpm_cutoff: float = 0.93
+    # 0 = igual ao block_size (janela) / igual a janela (hop).
+    window_size: int = 0
+    hop_size: int = 0
+    output_latency_s: float = 0.0
 
 
 @dataclass
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import math
+from typing import Dict, Optional
+
+import numpy as np
+
+# numpy < 2 nao aceita out= no FFT; nesse caso o espectro ainda e copiado para o buffer.
+_FFT_OUT = np.lib.NumpyVersion(np.__version__) >= "2.0.0"
+
+
+class FrameFeatures:
+    def __init__(self, rows: int = 8, size: int = 1024):
+        self.count = 0
+        self.size = 0
+        self._windows: Dict[int, np.ndarray] = {}
+        self._allocate(rows, size)
+
+    def compute(self, frames: np.ndarray) -> "FrameFeatures":
+        # Uma passada por janela: media, amostras sem DC, energia e pico em buffers reaproveitados.
+        # Aceita (..., amostras), inclusive as views das janelas sobrepostas, sem copiar antes.
+        frames = np.atleast_2d(frames)
+        lead, size = frames.shape[:-1], frames.shape[-1]
+        count = math.prod(lead)
+        if count > len(self._x) or size != self._x.shape[1]:
+            self._allocate(max(count, len(self._x)), size)
+        self.count = count
+        self.size = size
+        self._has_spectrum = False
+        if not count or not size:
+            return self
+
+        mean = self._mean[:count].reshape(lead)
+        x = self._x[:count].reshape(frames.shape)
+        np.add.reduce(frames, axis=-1, dtype=np.float32, out=mean)
+        mean /= size
+        np.subtract(frames, mean[..., None], out=x)
+
+        # RMS do bloco cru (com DC), como o tracker sempre usou: media(x^2) + media^2.
+        power = self._rms[:count].reshape(lead)
+        low = self._low[:count].reshape(lead)
+        np.einsum("...i,...i->...", x, x, out=power)
+        power /= size
+        power += np.square(mean, out=low)
+        np.sqrt(power, out=power)
+
+        peak = self._peak[:count].reshape(lead)
+        np.max(x, axis=-1, out=peak)
+        np.min(x, axis=-1, out=low)
+        np.negative(low, out=low)
+        np.maximum(peak, low, out=peak)
+        return self
+
+    @property
+    def x(self) -> np.ndarray:
+        return self._x[: self.count]
+
+    @property
+    def rms(self) -> np.ndarray:
+        return self._rms[: self.count]
+
+    @property
+    def peak(self) -> np.ndarray:
+        return self._peak[: self.count]
+
+    def spectrum(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        # rfft das amostras sem DC com janela de Hann; so e calculado se algum backend pedir.
+        if rows is not None:
+            # Subconjunto de linhas (ex: so janelas com voz): calcula so essas, sem guardar.
+            return np.fft.rfft(self.x[rows] * self._window(self.size), axis=1)
+        if not self._has_spectrum:
+            windowed = self._windowed[: self.count]
+            np.multiply(self.x, self._window(self.size), out=windowed)
+            if _FFT_OUT:
+                np.fft.rfft(windowed, axis=1, out=self._spectrum[: self.count])
+            else:
+                self._spectrum[: self.count] = np.fft.rfft(windowed, axis=1)
+            self._has_spectrum = True
+        return self._spectrum[: self.count]
+
+    def samples(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        return self.x if rows is None else self.x[rows]
+
+    def _allocate(self, rows: int, size: int) -> None:
+        self._x = np.zeros((rows, size), dtype=np.float32)
+        self._windowed = np.zeros((rows, size), dtype=np.float64)
+        self._spectrum = np.zeros((rows, size // 2 + 1), dtype=np.complex128)
+        self._mean = np.zeros(rows, dtype=np.float32)
+        self._rms = np.zeros(rows, dtype=np.float32)
+        self._peak = np.zeros(rows, dtype=np.float32)
+        self._low = np.zeros(rows, dtype=np.float32)
+        self._has_spectrum = False
+
+    def _window(self, size: int) -> np.ndarray:
+        window = self._windows.get(size)
+        if window is None:
+            window = np.hanning(size)
+            self._windows[size] = window
+        return window
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .config import AudioConfig
+
+
+class FrameAssembler:
+    def __init__(self, window: int, hop: int, channels: int, sample_rate: int, block_size: int):
+        if window <= 0 or not 0 < hop <= window:
+            raise ValueError(f"Janela/hop invalidos: janela {window}, hop {hop}.")
+        self.window = window
+        self.hop = hop
+        self._hop = hop
+        self.sample_rate = sample_rate
+        # Espaco para a janela mais alguns blocos: so compacta quando o fim do buffer enche.
+        self._buffer = np.zeros((max(2 * window, window + 4 * block_size), channels), dtype=np.float32)
+        self._start = 0
+        self._end = 0
+        self._start_time = 0.0
+        self._last_time = -np.inf
+
+    def reset(self) -> None:
+        self._start = self._end = 0
+
+    def set_overlap(self, enabled: bool) -> None:
+        # Sem sobreposicao cada amostra entra em uma janela so (menos FFTs por bloco).
+        self.hop = self._hop if enabled else self.window
+
+    def push(self, block: np.ndarray, time_s: float) -> None:
+        count = len(block)
+        pending = self._end - self._start
+        if self._end + count > len(self._buffer):
+            if pending + count > len(self._buffer):
+                grown = np.zeros((pending + count + self.window, self._buffer.shape[1]), dtype=np.float32)
+                grown[:pending] = self._buffer[self._start : self._end]
+                self._buffer = grown
+            else:
+                self._buffer[:pending] = self._buffer[self._start : self._end]
+            self._start, self._end = 0, pending
+        # Reancora no tempo do bloco novo para seguir as correcoes do relogio.
+        self._start_time = time_s - pending / self.sample_rate
+        self._buffer[self._end : self._end + count] = block
+        self._end += count
+
+    def take(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        # Devolve (tempos do centro de cada janela, janelas [n, canais, amostras]) sem copiar;
+        # as janelas apontam para o buffer e so valem ate o proximo push().
+        available = self._end - self._start
+        if available < self.window:
+            return None
+        count = (available - self.window) // self.hop + 1
+        span = self._buffer[self._start : self._start + (count - 1) * self.hop + self.window]
+        windows = sliding_window_view(span, self.window, axis=0)[:: self.hop]
+        offsets = np.arange(count) * self.hop + self.window / 2.0
+        # O reancoramento pode puxar o tempo para tras; as notas precisam de tempos em ordem.
+        times = np.maximum(self._start_time + offsets / self.sample_rate, self._last_time)
+        self._last_time = float(times[-1])
+        self._start += count * self.hop
+        self._start_time += count * self.hop / self.sample_rate
+        return times, windows
+
+
+def create_frame_assembler(audio_cfg: AudioConfig) -> FrameAssembler:
+    window = audio_cfg.window_size or audio_cfg.block_size
+    hop = audio_cfg.hop_size or window
+    return FrameAssembler(window, hop, audio_cfg.channels, audio_cfg.sample_rate, audio_cfg.block_size)
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+# Blocos ainda no ring depois do poll e tempo de trabalho do laco (sem a espera do fps).
+QUEUE_HIGH_BLOCKS = 3
+QUEUE_LOW_BLOCKS = 1
+LOOP_HIGH_S = 0.05
+LOOP_LOW_S = 0.025
+LOOP_ALPHA = 0.1
+DEGRADE_HOLD_S = 1.0
+RECOVER_HOLD_S = 5.0
+RECOVER_HOLD_MAX_S = 60.0
+CHEAP_BACKEND = "autocorr"
+
+
+@dataclass(frozen=True)
+class QualityLevel:
+    name: str
+    ui_fps: int
+    skip_silent: bool = False
+    cheap_pitch: bool = False
+    # Intervalo minimo entre atualizacoes do texto (letra e placar); 0 = todo quadro.
+    text_refresh_s: float = 0.0
+
+
+# Cada nivel corta mais carga que o anterior.
+LEVELS: Tuple[QualityLevel, ...] = (
+    QualityLevel("normal", 30),
+    QualityLevel("quadros", 20),
+    QualityLevel("silencio", 20, skip_silent=True),
+    QualityLevel("pitch", 15, skip_silent=True, cheap_pitch=True),
+    QualityLevel("texto", 10, skip_silent=True, cheap_pitch=True, text_refresh_s=0.25),
+)
+
+
+class QualityGovernor:
+    def __init__(self, levels: Tuple[QualityLevel, ...] = LEVELS):
+        self.levels = levels
+        self.index = 0
+        self.loop_s = 0.0
+        self.changes = 0
+        self.worst = 0
+        self._pressure_since: Optional[float] = None
+        self._calm_since: Optional[float] = None
+        self._recovered_at: Optional[float] = None
+        self._recover_hold_s = RECOVER_HOLD_S
+
+    @property
+    def level(self) -> QualityLevel:
+        return self.levels[self.index]
+
+    def observe(self, queue_blocks: int, loop_s: float, now: float) -> Optional[QualityLevel]:
+        # Devolve o nivel novo quando muda; so anda um nivel por vez.
+        self.loop_s = (1.0 - LOOP_ALPHA) * self.loop_s + LOOP_ALPHA * loop_s
+        pressure = queue_blocks >= QUEUE_HIGH_BLOCKS or self.loop_s > LOOP_HIGH_S
+        calm = queue_blocks <= QUEUE_LOW_BLOCKS and self.loop_s < LOOP_LOW_S
+
+        if pressure:
+            self._calm_since = None
+            if self._pressure_since is None:
+                self._pressure_since = now
+            if now - self._pressure_since >= DEGRADE_HOLD_S and self.index + 1 < len(self.levels):
+                if self._recovered_at is not None and now - self._recovered_at < self._recover_hold_s:
+                    # Voltou a apertar logo depois de recuperar: espera mais antes de tentar de novo.
+                    self._recover_hold_s = min(self._recover_hold_s * 2.0, RECOVER_HOLD_MAX_S)
+                return self._move(1, now)
+            return None
+
+        self._pressure_since = None
+        if not calm:
+            self._calm_since = None
+            return None
+        if self._calm_since is None:
+            self._calm_since = now
+        if now - self._calm_since >= self._recover_hold_s and self.index > 0:
+            self._recovered_at = now
+            return self._move(-1, now)
+        if self._recovered_at is not None and now - self._recovered_at >= RECOVER_HOLD_MAX_S:
+            self._recover_hold_s = RECOVER_HOLD_S
+        return None
+
+    def describe(self, queue_blocks: int) -> str:
+        return f"Qualidade: {self.level.name} (fila {queue_blocks} blocos, laco {self.loop_s * 1000.0:.0f} ms)"
+
+    def _move(self, step: int, now: float) -> QualityLevel:
+        self.index += step
+        self.worst = max(self.worst, self.index)
+        self.changes += 1
+        self._pressure_since = None
+        self._calm_since = now if step < 0 else None
+        return self.level
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import math
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pygame
+
+from .melody import Melody
+
+LANE_SECONDS = 5.0
+# Posicao do cursor (agora) como fracao da largura; a esquerda fica o rastro do que foi cantado.
+LANE_LEAD = 0.3
+LANE_MARGIN_MIDI = 2.0
+LANE_MIN_RANGE_MIDI = 12.0
+LANE_MIN_HEIGHT = 60
+TRACE_POINTS = 256
+STRIP_SPARE_PX = 256
+LANE_BG = (14, 20, 34)
+LANE_GRID = (30, 40, 62)
+NOTE_COLOR = (110, 130, 170)
+CURSOR_COLOR = (240, 240, 240)
+
+
+class PitchTrace:
+    def __init__(self, channels: int, size: int = TRACE_POINTS):
+        self.times = np.full(size, -np.inf)
+        self.midi = np.full((size, channels), np.nan)
+        self.count = 0
+
+    @property
+    def last_time(self) -> float:
+        if not self.count:
+            return -math.inf
+        return float(self.times[(self.count - 1) % len(self.times)])
+
+    def push(self, time_s: float, pitch_hz: Sequence[Optional[float]]) -> None:
+        slot = self.count % len(self.times)
+        hz = np.array([np.nan if value is None else value for value in pitch_hz], dtype=np.float64)
+        self.times[slot] = time_s
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.midi[slot, : len(hz)] = 69.0 + 12.0 * np.log2(hz / 440.0)
+        self.count += 1
+
+    def since(self, start_s: float) -> Tuple[np.ndarray, np.ndarray]:
+        # Pontos a partir de start_s em ordem cronologica.
+        kept = min(self.count, len(self.times))
+        order = np.arange(self.count - kept, self.count) % len(self.times)
+        times = self.times[order]
+        recent = times >= start_s
+        return times[recent], self.midi[order[recent]]
+
+
+class NoteLane:
+    def __init__(self, rect: pygame.Rect):
+        self.rect = rect
+        self.px_per_s = rect.width / LANE_SECONDS
+        # Faixa circular ja desenhada: cada quadro so desenha as colunas novas e copia a janela visivel.
+        self.strip = pygame.Surface((rect.width + STRIP_SPARE_PX, rect.height)).convert()
+        self.melodies: List[Melody] = []
+        self.colors: Sequence[Tuple[int, int, int]] = (NOTE_COLOR,)
+        self.trace = PitchTrace(1)
+        self.low = 48.0
+        self.high = 72.0
+        self._first_px = 0
+        self._end_px: Optional[int] = None
+
+    def set_song(self, melodies: List[Melody], channels: int, colors: Sequence[Tuple[int, int, int]]) -> None:
+        self.melodies = [melody for melody in melodies if len(melody)]
+        self.colors = colors
+        values = [melody.midi for melody in self.melodies]
+        if values:
+            low = float(min(value.min() for value in values)) - LANE_MARGIN_MIDI
+            high = float(max(value.max() for value in values)) + LANE_MARGIN_MIDI
+        else:
+            low, high = 48.0, 72.0
+        extra = max(LANE_MIN_RANGE_MIDI - (high - low), 0.0) / 2.0
+        self.low = math.floor(low - extra)
+        self.high = math.ceil(high + extra)
+        self.trace = PitchTrace(channels)
+        self._end_px = None
+
+    def draw(
+        self,
+        screen: pygame.Surface,
+        time_s: float,
+        pitch_hz: Sequence[Optional[float]],
+        dirty: List[pygame.Rect],
+    ) -> None:
+        if pitch_hz and time_s > self.trace.last_time:
+            self.trace.push(time_s, pitch_hz)
+        left_px = int(round(time_s * self.px_per_s)) - int(LANE_LEAD * self.rect.width)
+        self._extend(left_px, left_px + self.rect.width)
+        self._blit_strip(screen, left_px)
+        # Linhas grossas e pontos nas bordas vazariam para fora do retangulo sujo.
+        clip = screen.get_clip()
+        screen.set_clip(self.rect)
+        self._draw_trace(screen, left_px)
+        cursor_x = self.rect.x + int(LANE_LEAD * self.rect.width)
+        pygame.draw.line(screen, CURSOR_COLOR, (cursor_x, self.rect.top), (cursor_x, self.rect.bottom - 1))
+        screen.set_clip(clip)
+        dirty.append(self.rect)
+
+    def _extend(self, left_px: int, right_px: int) -> None:
+        width = self.strip.get_width()
+        if self._end_px is None or left_px < self._first_px or left_px >= self._end_px:
+            # Primeiro quadro, volta no tempo ou salto: redesenha so a janela visivel.
+            self._render(left_px, right_px)
+            self._first_px, self._end_px = left_px, right_px
+            return
+        if right_px > self._end_px:
+            self._render(self._end_px, right_px)
+            self._end_px = right_px
+            self._first_px = max(self._first_px, right_px - width)
+
+    def _render(self, start_px: int, end_px: int) -> None:
+        width = self.strip.get_width()
+        while start_px < end_px:
+            strip_x = start_px % width
+            span = min(end_px - start_px, width - strip_x)
+            self._render_segment(start_px, strip_x, span)
+            start_px += span
+
+    def _render_segment(self, start_px: int, strip_x: int, span: int) -> None:
+        height = self.rect.height
+        area = pygame.Rect(strip_x, 0, span, height)
+        self.strip.set_clip(area)
+        self.strip.fill(LANE_BG, area)
+        for midi in range(int(self.low) + 1, int(self.high)):
+            if midi % 12 == 0:
+                y = self._y(midi)
+                pygame.draw.line(self.strip, LANE_GRID, (strip_x, y), (strip_x + span - 1, y))
+
+        bar = max(int(height / (self.high - self.low)), 4)
+        start_s = start_px / self.px_per_s
+        end_s = (start_px + span) / self.px_per_s
+        for index, melody in enumerate(self.melodies):
+            # Em duetos cada parte tem a cor (mais escura) do seu cantor.
+            color = NOTE_COLOR if len(self.melodies) == 1 else _dim(self.colors[index % len(self.colors)])
+            for note in melody.overlapping(start_s, end_s).tolist():
+                note_start = int(round(melody.start_s[note] * self.px_per_s))
+                note_end = int(round(melody.end_s[note] * self.px_per_s))
+                x = strip_x + note_start - start_px
+                rect = pygame.Rect(x, self._y(melody.midi[note]) - bar // 2, max(note_end - note_start, 2), bar)
+                pygame.draw.rect(self.strip, color, rect, border_radius=3)
+        self.strip.set_clip(None)
+
+    def _blit_strip(self, screen: pygame.Surface, left_px: int) -> None:
+        width = self.strip.get_width()
+        strip_x = left_px % width
+        first = min(self.rect.width, width - strip_x)
+        screen.blit(self.strip, self.rect.topleft, pygame.Rect(strip_x, 0, first, self.rect.height))
+        if first < self.rect.width:
+            rest = pygame.Rect(0, 0, self.rect.width - first, self.rect.height)
+            screen.blit(self.strip, (self.rect.x + first, self.rect.y), rest)
+
+    def _draw_trace(self, screen: pygame.Surface, left_px: int) -> None:
+        times, midi = self.trace.since(left_px / self.px_per_s)
+        if not len(times):
+            return
+        xs = (self.rect.x + np.round(times * self.px_per_s) - left_px).astype(int).tolist()
+        clipped = np.clip(midi, self.low, self.high)
+        ys = (self.rect.y + (self.high - clipped) / (self.high - self.low) * (self.rect.height - 1)).tolist()
+        for channel in range(midi.shape[1]):
+            color = self.colors[channel % len(self.colors)]
+            run: List[Tuple[int, float]] = []
+            # Um trecho por sequencia com voz; sem pitch (NaN) quebra a linha.
+            for x, row in zip(xs, ys):
+                y = row[channel]
+                if math.isnan(y):
+                    _draw_run(screen, color, run)
+                    run = []
+                    continue
+                run.append((x, y))
+            _draw_run(screen, color, run)
+
+    def _y(self, midi: float) -> int:
+        return int((self.high - midi) / (self.high - self.low) * (self.rect.height - 1))
+
+
+def _dim(color: Tuple[int, int, int]) -> Tuple[int, int, int]:
+    return (color[0] * 3 // 5, color[1] * 3 // 5, color[2] * 3 // 5)
+
+
+def _draw_run(screen: pygame.Surface, color: Tuple[int, int, int], run: List[Tuple[int, float]]) -> None:
+    if len(run) > 1:
+        pygame.draw.lines(screen, color, False, run, 3)
+    elif run:
+        pygame.draw.circle(screen, color, (run[0][0], int(run[0][1])), 2)
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 import re
+from bisect import bisect_right
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import List, Optional, Sequence, Tuple
 
 
 @dataclass(frozen=True)
@@ -12,14 +13,38 @@ class LyricLine:
     text: str
 
 
+class TimeCursor:
+    def __init__(self, times: Sequence[float]):
+        self.times = times
+        self.index = -1
+
+    def seek(self, time_s: float) -> int:
+        times = self.times
+        idx = self.index
+        if idx >= 0 and times[idx] > time_s:
+            # Volta no tempo (seek/rewind): busca binaria.
+            idx = bisect_right(times, time_s) - 1
+        else:
+            steps = 0
+            while idx + 1 < len(times) and times[idx + 1] <= time_s:
+                idx += 1
+                steps += 1
+                if steps > 8:
+                    idx = bisect_right(times, time_s) - 1
+                    break
+        self.index = idx
+        return idx
+
+
 class Lyrics:
     def __init__(self, lines: List[LyricLine]):
         self.lines = sorted(lines, key=lambda x: x.time_s)
+        self._cursor = TimeCursor([line.time_s for line in self.lines])
 
     @classmethod
     def from_lrc(cls, path: Path) -> "Lyrics":
         lines: List[LyricLine] = []
-        timestamp_re = re.compile(r"\\[(\\d+):(\\d+(?:\\.\\d+)?)\\]")
+        timestamp_re = re.compile(r"\[(\d+):(\d+(?:\.\d+)?)\]")
         for raw in path.read_text(encoding="utf-8").splitlines():
             if not raw.strip():
                 continue
@@ -33,11 +58,10 @@ class Lyrics:
         return cls(lines)
 
     def current_and_next(self, time_s: float) -> Tuple[Optional[LyricLine], Optional[LyricLine]]:
-        if not self.lines:
-            return None, None
-        idx = 0
-        while idx + 1 < len(self.lines) and self.lines[idx + 1].time_s <= time_s:
-            idx += 1
-        current = self.lines[idx] if self.lines[idx].time_s <= time_s else None
-        next_line = self.lines[idx + 1] if idx + 1 < len(self.lines) else None
-        return current, next_line
+        current, upcoming = self.lookahead(time_s, 1)
+        return current, upcoming[0] if upcoming else None
+
+    def lookahead(self, time_s: float, count: int) -> Tuple[Optional[LyricLine], List[LyricLine]]:
+        idx = self._cursor.seek(time_s)
+        current = self.lines[idx] if idx >= 0 else None
+        return current, self.lines[idx + 1 : idx + 1 + count]
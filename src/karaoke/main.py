@@ -1,79 +1,154 @@
 from __future__ import annotations
 
 import argparse
-import queue
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional, Union
 
-import numpy as np
 import sounddevice as sd
 
+from .analysis import LocalAnalysis, ProcessAnalysis
+from .catalog import Catalog
 from .config import AudioConfig, NoteTrackingConfig, ScoringConfig
+from .governor import LEVELS, QualityGovernor, QualityLevel
 from .lyrics import LyricLine
-from .pitch import PitchEstimator
-from .scoring import ScoreBreakdown, score_notes
+from .pcmcache import DEFAULT_MAX_MB, DEFAULT_ROOT, PcmCache
+from .pitch import PITCH_BACKENDS
+from .profiling import PROFILE_TOOLS, Profiler
+from .scoring import IncrementalScorer, ScoreBreakdown
 from .song import Song
-from .tracking import NoteTracker, UserNote
-from .ui import PygameUI, UIState
+from .telemetry import LatencyTelemetry
+from .ui import PygameUI, SingerScore, TextKey, UIState
 
+OVERLAY_REFRESH_S = 0.5
+HEADLESS_TAIL_S = 2.0
 
-class SongClock:
-    def __init__(self, sample_rate: int):
-        self.sample_rate = sample_rate
-        self.time_s = 0.0
 
-    def advance(self, frames: int) -> float:
-        current = self.time_s
-        self.time_s += frames / self.sample_rate
-        return current
-
-    def nudge(self, target_time_s: float) -> None:
-        drift = target_time_s - self.time_s
-        self.time_s += drift * 0.05
+@dataclass
+class PreparedSong:
+    song: Song
+    audio_path: Path
+    surfaces: Dict[TextKey, object] = field(default_factory=dict)
 
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Karaoke com nota (Pi 3)")
-    parser.add_argument("--song", required=True, help="Pasta da musica dentro de songs/")
+    parser.add_argument(
+        "--song",
+        nargs="+",
+        help="Pasta da musica dentro de songs/ (ou busca no catalogo); varias formam uma fila",
+    )
+    parser.add_argument("--playlist", help="Arquivo com uma musica (pasta ou busca) por linha")
+    parser.add_argument("--library", default="songs", help="Pasta raiz do catalogo de musicas")
     parser.add_argument("--fullscreen", action="store_true", help="Tela cheia")
     parser.add_argument("--headless", action="store_true", help="Sem UI/sem playback")
     parser.add_argument("--device", help="Dispositivo de entrada de audio (indice ou nome)")
+    parser.add_argument("--channels", type=int, default=1, help="Canais de entrada (um cantor/microfone por canal)")
     parser.add_argument("--samplerate", type=int, default=44100, help="Sample rate")
     parser.add_argument("--blocksize", type=int, default=1024, help="Tamanho do bloco de audio")
+    parser.add_argument("--window", type=int, default=0, help="Janela de analise em amostras (0 = blocksize)")
+    parser.add_argument("--hop", type=int, default=0, help="Passo entre janelas em amostras (0 = janela)")
+    parser.add_argument(
+        "--output-latency-ms",
+        type=float,
+        default=0.0,
+        help="Atraso entre o mixer e o alto-falante (compensa o relogio da musica)",
+    )
+    parser.add_argument(
+        "--pitch-backend",
+        choices=sorted(PITCH_BACKENDS),
+        default=AudioConfig.pitch_backend,
+        help="Algoritmo de deteccao de pitch",
+    )
+    parser.add_argument(
+        "--analysis-process",
+        action="store_true",
+        help="Roda pitch e deteccao de notas em outro processo (usa outro nucleo)",
+    )
+    parser.add_argument("--pcm-cache", default=str(DEFAULT_ROOT), help="Cache de WAV decodificado de OGG/MP3")
+    parser.add_argument("--pcm-cache-mb", type=int, default=DEFAULT_MAX_MB, help="Tamanho maximo do cache de WAV")
+    parser.add_argument("--no-pcm-cache", action="store_true", help="Toca OGG/MP3 direto, sem cache de WAV")
+    parser.add_argument("--latency-log", help="Salva percentis/histogramas de latencia (JSON) ao sair")
+    parser.add_argument("--latency-overlay", action="store_true", help="Mostra a latencia de cada etapa na tela")
+    parser.add_argument(
+        "--no-governor",
+        action="store_true",
+        help="Nao reduz a qualidade (fps, pitch, texto) quando o laco principal atrasa",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Mede cada etapa, grava estatisticas periodicas e mostra o overlay de desempenho (F3)",
+    )
+    parser.add_argument("--profile-log", default="perfil.jsonl", help="Arquivo JSONL das estatisticas do --profile")
+    parser.add_argument(
+        "--profile-tool",
+        choices=PROFILE_TOOLS,
+        help="Alem dos tempos por etapa, roda cProfile ou amostras da thread principal (implica --profile)",
+    )
     return parser.parse_args()
 
 
 def main() -> int:
     args = parse_args()
-    song = Song.from_dir(Path(args.song))
-
-    audio_cfg = AudioConfig(sample_rate=args.samplerate, block_size=args.blocksize)
+    specs = list(args.song or [])
+    if args.playlist:
+        specs.extend(_read_playlist(Path(args.playlist)))
+    if not specs:
+        print("Informe --song ou --playlist.")
+        return 2
+
+    audio_cfg = AudioConfig(
+        sample_rate=args.samplerate,
+        block_size=args.blocksize,
+        window_size=args.window,
+        hop_size=args.hop,
+        channels=max(args.channels, 1),
+        pitch_backend=args.pitch_backend,
+        output_latency_s=args.output_latency_ms / 1000.0,
+    )
     tracking_cfg = NoteTrackingConfig()
     scoring_cfg = ScoringConfig()
-
-    pitch_estimator = PitchEstimator(
-        sample_rate=audio_cfg.sample_rate,
-        min_freq=audio_cfg.min_freq,
-        max_freq=audio_cfg.max_freq,
-        corr_threshold=audio_cfg.corr_threshold,
-    )
-    tracker = NoteTracker(tracking_cfg)
-
-    audio_queue: "queue.Queue[np.ndarray]" = queue.Queue()
-
-    def audio_callback(indata: np.ndarray, frames: int, time_info, status) -> None:
-        if status:
-            return
-        audio_queue.put(indata.copy())
-
+    telemetry = LatencyTelemetry() if args.latency_log or args.latency_overlay else None
+    profiler = None
+    if args.profile or args.profile_tool:
+        profiler = Profiler(Path(args.profile_log) if args.profile_log else None, args.profile_tool)
+    timings = profiler.stages if profiler is not None else None
+
+    if args.analysis_process:
+        analysis = ProcessAnalysis(audio_cfg, tracking_cfg, telemetry, timings)
+    else:
+        analysis = LocalAnalysis(audio_cfg, tracking_cfg, telemetry, timings)
+
+    try:
+        return _run(args, specs, audio_cfg, scoring_cfg, analysis, telemetry, profiler)
+    finally:
+        analysis.close()
+        if profiler is not None:
+            print("  Perfil:" + (f" estatisticas em {args.profile_log}" if args.profile_log else ""))
+            for line in profiler.close():
+                print(f"    {line}")
+
+
+def _run(
+    args: argparse.Namespace,
+    specs: List[str],
+    audio_cfg: AudioConfig,
+    scoring_cfg: ScoringConfig,
+    analysis: Union[LocalAnalysis, ProcessAnalysis],
+    telemetry: Optional[LatencyTelemetry],
+    profiler: Optional[Profiler] = None,
+) -> int:
+    ring = analysis.ring
     stream = sd.InputStream(
         channels=audio_cfg.channels,
         samplerate=audio_cfg.sample_rate,
         blocksize=audio_cfg.block_size,
         device=args.device,
-        callback=audio_callback,
+        callback=ring.callback,
     )
 
     ui: Optional[PygameUI] = None
@@ -82,60 +157,270 @@ def main() -> int:
         import pygame
 
         pygame.mixer.init(frequency=audio_cfg.sample_rate)
-        pygame.mixer.music.load(str(song.audio_path))
+        if profiler is not None:
+            ui.timings = profiler.stages
+            ui.show_profile = True
+
+    cache = None
+    if not args.no_pcm_cache:
+        cache = PcmCache(Path(args.pcm_cache), args.pcm_cache_mb << 20, audio_cfg.sample_rate)
+    library = Path(args.library)
+    governor = None if args.no_governor else QualityGovernor()
+    if governor is not None:
+        _apply_quality(governor.level, analysis, ui)
+    if profiler is not None:
+        profiler.start()
+
+    # Enquanto uma musica toca, a proxima e carregada, decodificada e tem o texto renderizado.
+    preload = ThreadPoolExecutor(max_workers=1, thread_name_prefix="karaoke-preload")
+    played = 0
+    try:
+        with stream:
+            pending = preload.submit(_prepare, specs[0], library, cache, ui, False)
+            for index, spec in enumerate(specs):
+                try:
+                    prepared = pending.result()
+                except (OSError, ValueError, KeyError) as exc:
+                    print(f"Pulando {spec}: {exc}")
+                    prepared = None
+                if index + 1 < len(specs):
+                    pending = preload.submit(_prepare, specs[index + 1], library, cache, ui, True)
+                if prepared is None:
+                    continue
+                played += 1
+                try:
+                    keep_going = _play(
+                        args, prepared, audio_cfg, scoring_cfg, analysis, telemetry, ui, governor, profiler
+                    )
+                finally:
+                    if cache is not None:
+                        cache.release(prepared.audio_path)
+                if not keep_going:
+                    break
+    finally:
+        preload.shutdown(wait=False, cancel_futures=True)
+
+    if ring.dropped_frames or ring.overflows or ring.underflows:
+        print(
+            f"  Captura:  {ring.dropped_frames} amostras perdidas "
+            f"({ring.overruns} blocos descartados, {ring.overflows} overflows, {ring.underflows} underflows)"
+        )
+    if governor is not None and governor.changes:
+        print(f"  Qualidade: {governor.changes} mudancas de nivel, pior nivel {governor.levels[governor.worst].name}")
+    if ui:
+        print(f"  Quadro UI: {ui.frame_ms:.2f} ms (media de desenho)")
+        ui.close()
+    if telemetry is not None:
+        print("  Latencia desde o ADC:")
+        for line in telemetry.lines():
+            print(f"    {line}")
+        if args.latency_log:
+            telemetry.dump(Path(args.latency_log))
+            print(f"  Latencia salva em {args.latency_log}")
+    return 0 if played else 2
+
+
+def _prepare(
+    spec: str,
+    library: Path,
+    cache: Optional[PcmCache],
+    ui: Optional[PygameUI],
+    decode: bool,
+) -> PreparedSong:
+    song_dir = _resolve_song_dir(spec, library)
+    if song_dir is None:
+        raise FileNotFoundError(f"Musica nao encontrada: {spec}")
+    song = Song.from_dir(song_dir)
+    surfaces = {}
+    if ui is not None:
+        surfaces = ui.prerender(song.title, song.artist, [line.text for line in song.lyrics.lines])
+    return PreparedSong(song, _playback_path(cache, song.audio_path, decode), surfaces)
+
+
+def _play(
+    args: argparse.Namespace,
+    prepared: PreparedSong,
+    audio_cfg: AudioConfig,
+    scoring_cfg: ScoringConfig,
+    analysis: Union[LocalAnalysis, ProcessAnalysis],
+    telemetry: Optional[LatencyTelemetry],
+    ui: Optional[PygameUI],
+    governor: Optional[QualityGovernor] = None,
+    profiler: Optional[Profiler] = None,
+) -> bool:
+    song = prepared.song
+    print(f"Tocando: {song.title}" + (f" - {song.artist}" if song.artist else ""))
+    if profiler is not None:
+        profiler.song = song.title
+    scorers = [IncrementalScorer.from_melody(song.melody_for(channel), scoring_cfg) for channel in range(audio_cfg.channels)]
+    names = _singer_names(song, audio_cfg.channels)
+    end_s = _song_end(song) + HEADLESS_TAIL_S
+    # ADC do bloco que gerou a ultima mudanca de nota ainda nao mostrada na tela.
+    pending_adc = 0.0
+    overlay: List[str] = []
+    overlay_at = 0.0
+    state: Optional[UIState] = None
+    state_at = 0.0
+
+    if ui:
+        import pygame
 
-    user_notes: list[UserNote] = []
-    last_scored_count = -1
-    breakdown = ScoreBreakdown(total=0.0, pitch=0.0, rhythm=0.0, matched=0, total_notes=len(song.melody.notes))
-    clock = SongClock(audio_cfg.sample_rate)
-    playback_started_at = None
+        ui.adopt(prepared.surfaces)
+        ui.set_song(song.melodies, audio_cfg.channels)
+        pygame.mixer.music.load(str(prepared.audio_path))
+        pygame.mixer.music.play()
+    playback_started_at = time.perf_counter()
+    analysis.begin(playback_started_at)
+
+    running = True
+    while running:
+        loop_started = time.perf_counter()
+        song_time = _get_song_time(playback_started_at, ui)
+        if song_time is not None:
+            analysis.sync(song_time, time.perf_counter())
+
+        polled = analysis.poll()
+        mark = profiler.lap("analise", loop_started) if profiler is not None else 0.0
+        for scorer, notes in zip(scorers, polled):
+            scorer.add(notes)
+        if profiler is not None:
+            profiler.lap("pontuacao", mark)
+        if telemetry is not None and analysis.notes_adc:
+            telemetry.record("pontuacao", time.perf_counter() - analysis.notes_adc)
+            pending_adc = analysis.notes_adc
+        queued = len(analysis.ring)
+        quality = governor.level if governor is not None else LEVELS[0]
+
+        if ui:
+            # No nivel mais baixo letra e placar so sao atualizados (e re-renderizados) a cada text_refresh_s.
+            if state is None or loop_started - state_at >= quality.text_refresh_s:
+                mark = time.perf_counter()
+                current, next_line = song.lyrics.current_and_next(max(analysis.song_time - song.audio_offset_s, 0.0))
+                breakdowns = [scorer.result() for scorer in scorers]
+                state = _build_ui_state(song, current, next_line, breakdowns, names)
+                state_at = loop_started
+                if profiler is not None:
+                    profiler.lap("estado", mark)
+            if args.latency_overlay and time.perf_counter() - overlay_at >= OVERLAY_REFRESH_S:
+                overlay = telemetry.lines()
+                if governor is not None:
+                    overlay.append(governor.describe(queued))
+                overlay_at = time.perf_counter()
+            state.overlay = overlay
+            state.lane_time_s = analysis.song_time
+            state.pitch_hz = [estimate.hz for estimate in analysis.pitches]
+            if profiler is not None:
+                state.profile = profiler.lines
+            drawn_at = time.perf_counter()
+            running = ui.update(state)
+            busy_s = drawn_at - loop_started + ui.last_frame_s
+            if pending_adc and ui.last_present >= pending_adc:
+                telemetry.record("tela", ui.last_present - pending_adc)
+                pending_adc = 0.0
 
-    with stream:
-        if not args.headless:
             import pygame
 
-            pygame.mixer.music.play()
-            playback_started_at = time.perf_counter()
+            if not pygame.mixer.music.get_busy():
+                running = False
         else:
-            playback_started_at = time.perf_counter()
-
-        running = True
-        while running:
-            song_time = _get_song_time(playback_started_at, ui)
-            if song_time is not None:
-                clock.nudge(song_time)
-
-            while not audio_queue.empty():
-                frame = audio_queue.get()
-                mono = frame[:, 0]
-                frame_time = clock.advance(len(mono))
-                estimate = pitch_estimator.estimate(mono)
-                new_notes = tracker.process(frame_time, mono, estimate.hz)
-                user_notes.extend(new_notes)
-
-            if ui:
-                current, next_line = song.lyrics.current_and_next(max(clock.time_s - song.audio_offset_s, 0.0))
-                if len(user_notes) != last_scored_count:
-                    breakdown = score_notes(song.melody.notes, user_notes, scoring_cfg)
-                    last_scored_count = len(user_notes)
-                state = _build_ui_state(song, current, next_line, breakdown)
-                running = ui.update(state)
-            else:
-                time.sleep(0.01)
-
-            if not args.headless:
-                import pygame
-
-                if not pygame.mixer.music.get_busy():
-                    running = False
-
-        user_notes.extend(tracker.flush())
-
-    final_score = score_notes(song.melody.notes, user_notes, scoring_cfg)
-    _print_final(final_score)
+            busy_s = time.perf_counter() - loop_started
+            time.sleep(0.01)
+            if song_time is not None and song_time >= end_s:
+                running = False
+
+        if governor is not None:
+            level = governor.observe(queued, busy_s, time.perf_counter())
+            if level is not None:
+                print(governor.describe(queued))
+                _apply_quality(level, analysis, ui)
+        if profiler is not None:
+            profiler.quality = quality.name
+            profiler.tick(
+                time.perf_counter(),
+                busy_s,
+                analysis.ring.read_count,
+                queued,
+                analysis.ring.overruns,
+                analysis.ring.dropped_frames,
+            )
+
+    clock_error_s = analysis.clock_error_s
+    for scorer, notes in zip(scorers, analysis.flush()):
+        scorer.add(notes)
     if ui:
-        ui.close()
-    return 0
+        import pygame
+
+        pygame.mixer.music.stop()
+
+    for name, scorer in zip(names, scorers):
+        _print_final(scorer.result(), name if len(scorers) > 1 else None)
+    if clock_error_s < float("inf"):
+        print(
+            f"  Relogio:  erro estimado {clock_error_s * 1000.0:.1f} ms "
+            f"(tolerancia de ritmo {scoring_cfg.rhythm_tolerance_s * 1000.0:.0f} ms)"
+        )
+    return not (ui and ui.quit_requested)
+
+
+def _apply_quality(
+    level: QualityLevel,
+    analysis: Union[LocalAnalysis, ProcessAnalysis],
+    ui: Optional[PygameUI],
+) -> None:
+    analysis.set_quality(level)
+    if ui:
+        ui.fps = level.ui_fps
+
+
+def _read_playlist(path: Path) -> List[str]:
+    specs: List[str] = []
+    for raw in path.read_text(encoding="utf-8").splitlines():
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        # Caminhos relativos valem a partir da pasta da playlist; o resto vira busca no catalogo.
+        candidate = path.parent / line
+        specs.append(str(candidate) if candidate.is_dir() else line)
+    return specs
+
+
+def _resolve_song_dir(value: str, library: Path) -> Optional[Path]:
+    path = Path(value)
+    if path.is_dir() or not library.is_dir():
+        return path
+    with Catalog(library) as catalog:
+        catalog.refresh()
+        matches = catalog.search(value, limit=1) or catalog.fuzzy(value, limit=1)
+    if not matches:
+        return None
+    return matches[0].path
+
+
+def _playback_path(cache: Optional[PcmCache], audio_path: Path, decode: bool) -> Path:
+    if cache is None:
+        return audio_path
+    # O WAV fica protegido da limpeza do cache ate a musica terminar de tocar (release em _run).
+    cached = cache.lookup(audio_path)
+    if cached is not None:
+        cache.protect(cached)
+        return cached
+    if not decode:
+        # Sem tempo de decodificar antes de tocar: toca o comprimido e deixa o WAV pronto para a proxima vez.
+        cache.prefetch(audio_path)
+        return audio_path
+    try:
+        cached = cache.ensure(audio_path)
+        cache.protect(cached)
+        return cached
+    except (OSError, RuntimeError, ValueError) as exc:
+        print(f"Falha ao decodificar {audio_path}: {exc}")
+        return audio_path
+
+
+def _song_end(song: Song) -> float:
+    ends = [float(melody.end_s.max()) for melody in song.melodies if len(melody)]
+    ends.extend(line.time_s for line in song.lyrics.lines)
+    return max(ends, default=0.0) + song.audio_offset_s
 
 
 def _get_song_time(start_time: Optional[float], ui: Optional[PygameUI]) -> Optional[float]:
@@ -155,8 +440,15 @@ def _build_ui_state(
     song: Song,
     current: Optional[LyricLine],
     next_line: Optional[LyricLine],
-    breakdown: ScoreBreakdown,
+    breakdowns: List[ScoreBreakdown],
+    names: List[str],
 ) -> UIState:
+    breakdown = breakdowns[0]
+    singers = []
+    if len(breakdowns) > 1:
+        singers = [
+            SingerScore(name, item.total, item.matched, item.total_notes) for name, item in zip(names, breakdowns)
+        ]
     return UIState(
         title=song.title,
         artist=song.artist,
@@ -167,12 +459,18 @@ def _build_ui_state(
         score_rhythm=breakdown.rhythm,
         notes_done=breakdown.matched,
         notes_total=breakdown.total_notes,
+        singers=singers,
     )
 
 
-def _print_final(breakdown: ScoreBreakdown) -> None:
+def _singer_names(song: Song, channels: int) -> List[str]:
+    names = song.singers if len(song.melodies) > 1 else []
+    return [names[channel] if channel < len(names) else f"Cantor {channel + 1}" for channel in range(channels)]
+
+
+def _print_final(breakdown: ScoreBreakdown, name: Optional[str] = None) -> None:
     print("")
-    print("Resultado final:")
+    print(f"Resultado final ({name}):" if name else "Resultado final:")
     print(f"  Total:    {breakdown.total:05.1f}")
     print(f"  Afinacao: {breakdown.pitch:05.1f}")
     print(f"  Ritmo:    {breakdown.rhythm:05.1f}")
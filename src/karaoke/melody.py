@@ -3,7 +3,9 @@ from __future__ import annotations
 import csv
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import List, Optional
+
+import numpy as np
 
 
 @dataclass(frozen=True)
@@ -19,7 +21,39 @@ class ReferenceNote:
 
 class Melody:
     def __init__(self, notes: List[ReferenceNote]):
-        self.notes = sorted(notes, key=lambda n: n.start_s)
+        ordered = sorted(notes, key=lambda n: n.start_s)
+        self._adopt(
+            np.array([note.start_s for note in ordered], dtype=np.float64),
+            np.array([note.duration_s for note in ordered], dtype=np.float64),
+            np.array([note.end_s for note in ordered], dtype=np.float64),
+            np.array([note.midi for note in ordered], dtype=np.float64),
+            ordered,
+        )
+
+    @property
+    def notes(self) -> List[ReferenceNote]:
+        # Objetos so quando alguem pede; melodias vindas do cache ficam so nos arrays ate la.
+        if self._notes is None:
+            self._notes = [
+                ReferenceNote(start, duration, midi)
+                for start, duration, midi in zip(self.start_s.tolist(), self.duration_s.tolist(), self.midi.tolist())
+            ]
+        return self._notes
+
+    def __len__(self) -> int:
+        return len(self.start_s)
+
+    def active_at(self, time_s: float) -> np.ndarray:
+        # Indices das notas com inicio <= t < fim.
+        high = int(np.searchsorted(self.start_s, time_s, side="right"))
+        low = int(np.searchsorted(self._end_max, time_s, side="right"))
+        return low + np.flatnonzero(self.end_s[low:high] > time_s)
+
+    def overlapping(self, start_s: float, end_s: float) -> np.ndarray:
+        # Indices das notas que tocam o intervalo fechado [start_s, end_s].
+        high = int(np.searchsorted(self.start_s, end_s, side="right"))
+        low = int(np.searchsorted(self._end_max, start_s, side="left"))
+        return low + np.flatnonzero(self.end_s[low:high] >= start_s)
 
     @classmethod
     def from_csv(cls, path: Path) -> "Melody":
@@ -32,3 +66,32 @@ class Melody:
                 midi = float(row["midi"])
                 notes.append(ReferenceNote(start_s, duration_s, midi))
         return cls(notes)
+
+    @classmethod
+    def from_arrays(
+        cls,
+        start_s: np.ndarray,
+        duration_s: np.ndarray,
+        end_s: np.ndarray,
+        midi: np.ndarray,
+    ) -> "Melody":
+        # Guarda os arrays como vieram (ex: views do mmap do cache, sem copiar); ja em ordem de inicio.
+        melody = cls.__new__(cls)
+        melody._adopt(start_s, duration_s, end_s, midi, None)
+        return melody
+
+    def _adopt(
+        self,
+        start_s: np.ndarray,
+        duration_s: np.ndarray,
+        end_s: np.ndarray,
+        midi: np.ndarray,
+        notes: Optional[List[ReferenceNote]],
+    ) -> None:
+        self._notes = notes
+        self.start_s = start_s
+        self.duration_s = duration_s
+        self.end_s = end_s
+        self.midi = midi
+        # Maior fim ate cada nota: com notas sobrepostas os fins nao ficam em ordem, o maximo acumulado fica.
+        self._end_max = np.maximum.accumulate(end_s) if len(end_s) else end_s
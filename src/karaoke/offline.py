@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .config import AudioConfig, NoteTrackingConfig, ScoringConfig
+from .features import FrameFeatures
+from .frames import create_frame_assembler
+from .pitch import PITCH_BACKENDS, create_pitch_estimator
+from .scoring import ScoreBreakdown, score_melody
+from .song import Song
+from .tracking import NoteTracker, UserNote
+
+BATCH_BLOCKS = 64
+
+
+@dataclass
+class OfflineResult:
+    recording: str
+    breakdown: Optional[ScoreBreakdown]
+    duration_s: float
+    elapsed_s: float
+    error: Optional[str] = None
+
+    @property
+    def realtime_factor(self) -> float:
+        if self.elapsed_s <= 0.0:
+            return 0.0
+        return self.duration_s / self.elapsed_s
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Pontua gravacoes WAV do microfone sem tocar a musica.")
+    parser.add_argument("--song", required=True, help="Pasta da musica dentro de songs/")
+    parser.add_argument("recordings", nargs="+", help="Arquivos WAV gravados do microfone")
+    parser.add_argument("--blocksize", type=int, default=1024, help="Tamanho do bloco de audio")
+    parser.add_argument("--window", type=int, default=0, help="Janela de analise em amostras (0 = blocksize)")
+    parser.add_argument("--hop", type=int, default=0, help="Passo entre janelas em amostras (0 = janela)")
+    parser.add_argument(
+        "--pitch-backend",
+        choices=sorted(PITCH_BACKENDS),
+        default=AudioConfig.pitch_backend,
+        help="Algoritmo de deteccao de pitch",
+    )
+    parser.add_argument("--offset", type=float, default=0.0, help="Segundos a somar no tempo da gravacao")
+    parser.add_argument("--jobs", type=int, default=0, help="Processos em paralelo (0 = numero de CPUs)")
+    parser.add_argument("--json", action="store_true", help="Saida em JSON")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    song_dir = Path(args.song)
+    recordings = [Path(path) for path in args.recordings]
+    jobs = args.jobs or os.cpu_count() or 1
+    jobs = max(1, min(jobs, len(recordings)))
+
+    audio_cfg = AudioConfig(
+        block_size=args.blocksize,
+        pitch_backend=args.pitch_backend,
+        window_size=args.window,
+        hop_size=args.hop,
+    )
+    tasks = [(song_dir, path, audio_cfg, args.offset) for path in recordings]
+    if jobs == 1:
+        results = [_score_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(_score_task, tasks))
+
+    if args.json:
+        print(json.dumps([_result_dict(result) for result in results], indent=2))
+    else:
+        for result in results:
+            _print_result(result)
+
+    return 1 if any(result.error for result in results) else 0
+
+
+def score_recording(
+    song: Song,
+    path: Path,
+    audio_cfg: AudioConfig,
+    tracking_cfg: Optional[NoteTrackingConfig] = None,
+    scoring_cfg: Optional[ScoringConfig] = None,
+    offset_s: float = 0.0,
+) -> Tuple[ScoreBreakdown, float]:
+    sample_rate, blocks = read_wav_blocks(path, audio_cfg.block_size)
+    # Copia: a mesma configuracao vai para as outras gravacoes do lote.
+    audio_cfg = replace(audio_cfg, sample_rate=sample_rate, channels=1)
+    assembler = create_frame_assembler(audio_cfg)
+    features = FrameFeatures(size=assembler.window)
+    estimator = create_pitch_estimator(audio_cfg)
+    tracker = NoteTracker(tracking_cfg or NoteTrackingConfig())
+    users: List[UserNote] = []
+
+    samples = 0
+    for batch in blocks:
+        assembler.push(batch.reshape(-1, 1), offset_s + samples / sample_rate)
+        samples += batch.size
+        ready = assembler.take()
+        if ready is None:
+            continue
+        times, windows = ready
+        hz, _ = estimator.estimate_features(features.compute(windows[:, 0]))
+        for frame_time, frame_rms, pitch_hz in zip(times.tolist(), features.rms.tolist(), hz.tolist()):
+            pitch = None if np.isnan(pitch_hz) else pitch_hz
+            users.extend(tracker.process_rms(frame_time, frame_rms, pitch))
+    users.extend(tracker.flush())
+    # Com todas as notas em maos a pontuacao sai de uma vez, pelo caminho vetorizado.
+    return score_melody(song.melody, users, scoring_cfg or ScoringConfig()), samples / sample_rate
+
+
+def read_wav_blocks(path: Path, block_size: int, batch_blocks: int = BATCH_BLOCKS) -> Tuple[int, Iterator[np.ndarray]]:
+    handle = wave.open(str(path), "rb")
+    sample_rate = handle.getframerate()
+
+    def _blocks() -> Iterator[np.ndarray]:
+        with handle:
+            channels = handle.getnchannels()
+            width = handle.getsampwidth()
+            while True:
+                raw = handle.readframes(block_size * batch_blocks)
+                if not raw:
+                    break
+                mono = _decode_pcm(raw, width, channels)
+                count = len(mono) // block_size
+                if count == 0:
+                    break
+                yield mono[: count * block_size].reshape(count, block_size)
+
+    return sample_rate, _blocks()
+
+
+def _decode_pcm(raw: bytes, width: int, channels: int) -> np.ndarray:
+    if width == 1:
+        data = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        data = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 3:
+        packed = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        values = packed[:, 0].astype(np.int32) | (packed[:, 1].astype(np.int32) << 8) | (packed[:, 2].astype(np.int32) << 16)
+        values = np.where(values >= 1 << 23, values - (1 << 24), values)
+        data = values.astype(np.float32) / float(1 << 23)
+    elif width == 4:
+        data = np.frombuffer(raw, dtype="<i4").astype(np.float32) / float(1 << 31)
+    else:
+        raise ValueError(f"WAV com {width * 8} bits nao suportado.")
+    frames = len(data) // channels
+    return data[: frames * channels].reshape(frames, channels)[:, 0]
+
+
+def _score_task(task: Tuple[Path, Path, AudioConfig, float]) -> OfflineResult:
+    song_dir, path, audio_cfg, offset_s = task
+    started = time.perf_counter()
+    try:
+        song = Song.from_dir(song_dir)
+        breakdown, duration_s = score_recording(song, path, audio_cfg, offset_s=offset_s)
+    except (OSError, EOFError, wave.Error, ValueError) as exc:
+        return OfflineResult(str(path), None, 0.0, time.perf_counter() - started, error=str(exc) or type(exc).__name__)
+    return OfflineResult(str(path), breakdown, duration_s, time.perf_counter() - started)
+
+
+def _result_dict(result: OfflineResult) -> dict:
+    data = asdict(result)
+    data["realtime_factor"] = result.realtime_factor
+    return data
+
+
+def _print_result(result: OfflineResult) -> None:
+    print("")
+    print(f"{result.recording}:")
+    if result.error or result.breakdown is None:
+        print(f"  Falha: {result.error}")
+        return
+    breakdown = result.breakdown
+    print(f"  Total:    {breakdown.total:05.1f}")
+    print(f"  Afinacao: {breakdown.pitch:05.1f}")
+    print(f"  Ritmo:    {breakdown.rhythm:05.1f}")
+    print(f"  Notas:    {breakdown.matched}/{breakdown.total_notes}")
+    print(f"  Tempo:    {result.duration_s:.1f}s de audio em {result.elapsed_s:.2f}s ({result.realtime_factor:.0f}x)")
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import shutil
+import subprocess
+import threading
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_ROOT = Path.home() / ".cache" / "karaoke" / "pcm"
+DEFAULT_MAX_MB = 2048
+COMPRESSED = (".ogg", ".mp3")
+KEYS_NAME = "keys.json"
+HASH_CHUNK = 1 << 20
+
+
+class PcmCache:
+    def __init__(self, root: Path = DEFAULT_ROOT, max_bytes: int = DEFAULT_MAX_MB << 20, sample_rate: int = 44100):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._pending: Dict[Path, threading.Thread] = {}
+        # WAVs na fila ou tocando (contagem: a mesma musica pode estar duas vezes na fila).
+        self._protected: Dict[Path, int] = {}
+
+    def lookup(self, audio_path: Path) -> Optional[Path]:
+        if audio_path.suffix.lower() not in COMPRESSED:
+            return None
+        target = self._target(audio_path)
+        if not target.exists():
+            return None
+        # mtime marca o ultimo uso para o LRU.
+        os.utime(target)
+        return target
+
+    def ensure(self, audio_path: Path) -> Path:
+        if audio_path.suffix.lower() not in COMPRESSED:
+            return audio_path
+        cached = self.lookup(audio_path)
+        if cached is not None:
+            return cached
+        target = self._target(audio_path)
+        self.root.mkdir(parents=True, exist_ok=True)
+        temp = target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            decode_to_wav(audio_path, temp, self.sample_rate)
+            os.replace(temp, target)
+        finally:
+            if temp.exists():
+                temp.unlink()
+        self.evict(keep=target)
+        return target
+
+    def prefetch(self, audio_path: Path) -> Optional[threading.Thread]:
+        if audio_path.suffix.lower() not in COMPRESSED:
+            return None
+        with self._lock:
+            thread = self._pending.get(audio_path)
+            if thread is not None and thread.is_alive():
+                return thread
+            thread = threading.Thread(target=self._prefetch, args=(audio_path,), name="karaoke-pcm", daemon=True)
+            self._pending[audio_path] = thread
+        thread.start()
+        return thread
+
+    def protect(self, path: Path) -> None:
+        with self._lock:
+            self._protected[path] = self._protected.get(path, 0) + 1
+
+    def release(self, path: Path) -> None:
+        with self._lock:
+            count = self._protected.pop(path, 0) - 1
+            if count > 0:
+                self._protected[path] = count
+
+    def evict(self, keep: Optional[Path] = None) -> int:
+        entries = []
+        total = 0
+        for path in self.root.glob("*.wav"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+            total += stat.st_size
+        with self._lock:
+            protected = set(self._protected)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep or path in protected:
+                continue
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def _prefetch(self, audio_path: Path) -> None:
+        try:
+            self.ensure(audio_path)
+        except (OSError, RuntimeError, ValueError) as exc:
+            print(f"Falha ao decodificar {audio_path}: {exc}")
+
+    def _target(self, audio_path: Path) -> Path:
+        return self.root / f"{self._content_key(audio_path)}-{self.sample_rate}.wav"
+
+    def _content_key(self, audio_path: Path) -> str:
+        # Hash do conteudo, memorizado por caminho/mtime/tamanho para nao reler o arquivo a cada play.
+        resolved = audio_path.resolve()
+        stat = resolved.stat()
+        stamp = [stat.st_mtime_ns, stat.st_size]
+        keys_path = self.root / KEYS_NAME
+        with self._lock:
+            keys = _load_keys(keys_path)
+            entry = keys.get(str(resolved))
+            if entry and entry[:2] == stamp:
+                return entry[2]
+        digest = hashlib.blake2b(digest_size=16)
+        with resolved.open("rb") as handle:
+            for chunk in iter(lambda: handle.read(HASH_CHUNK), b""):
+                digest.update(chunk)
+        key = digest.hexdigest()
+        with self._lock:
+            keys = _load_keys(keys_path)
+            keys[str(resolved)] = stamp + [key]
+            self.root.mkdir(parents=True, exist_ok=True)
+            temp = keys_path.with_name(f"{KEYS_NAME}.{os.getpid()}.tmp")
+            temp.write_text(json.dumps(keys), encoding="utf-8")
+            os.replace(temp, keys_path)
+        return key
+
+
+def decode_to_wav(source: Path, dest: Path, sample_rate: int) -> None:
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg:
+        command = [ffmpeg, "-v", "error", "-y", "-i", str(source), "-ar", str(sample_rate)]
+        command += ["-acodec", "pcm_s16le", "-f", "wav", str(dest)]
+        # Prioridade baixa para nao disputar CPU com o pitch durante a musica. Via nice e nao preexec_fn:
+        # isto roda em threads de pre-carga, e preexec_fn nao e seguro com threads.
+        nice = shutil.which("nice")
+        if nice:
+            command = [nice, "-n", "10"] + command
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or f"ffmpeg falhou ({result.returncode})")
+        return
+
+    # Sem ffmpeg o pygame decodifica, mas em outro processo: driver dummy e mixer.init aqui mudariam o
+    # estado global do jogo (o mixer do player poderia subir mudo se a pre-carga rodasse antes).
+    with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as pool:
+        pool.submit(_decode_with_pygame, source, dest, sample_rate).result()
+
+
+def _decode_with_pygame(source: Path, dest: Path, sample_rate: int) -> None:
+    os.nice(10)
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    import pygame
+
+    pygame.mixer.init(frequency=sample_rate)
+    frequency = pygame.mixer.get_init()[0]
+    samples = pygame.sndarray.array(pygame.mixer.Sound(str(source)))
+    samples = np.ascontiguousarray(samples, dtype="<i2").reshape(len(samples), -1)
+    with wave.open(str(dest), "wb") as handle:
+        handle.setnchannels(samples.shape[1])
+        handle.setsampwidth(2)
+        handle.setframerate(frequency)
+        handle.writeframes(samples.tobytes())
+
+
+def _load_keys(path: Path) -> Dict[str, List]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Decodifica OGG/MP3 das musicas para WAV (cache de PCM).")
+    parser.add_argument("songs", nargs="*", help="Pastas de musicas (padrao: todas em --library)")
+    parser.add_argument("--library", default="songs", help="Pasta raiz das musicas")
+    parser.add_argument("--cache", default=str(DEFAULT_ROOT), help="Pasta do cache de PCM")
+    parser.add_argument("--max-mb", type=int, default=DEFAULT_MAX_MB, help="Tamanho maximo do cache em MB")
+    parser.add_argument("--samplerate", type=int, default=44100, help="Sample rate do mixer")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    cache = PcmCache(Path(args.cache), args.max_mb << 20, args.samplerate)
+    folders = [Path(song) for song in args.songs] or sorted(path.parent for path in Path(args.library).rglob("melody.csv"))
+    failures = 0
+    for folder in folders:
+        for name in ("audio.ogg", "audio.mp3"):
+            audio_path = folder / name
+            if not audio_path.exists() or (folder / "audio.wav").exists():
+                continue
+            try:
+                print(f"{folder}: {cache.ensure(audio_path)}")
+            except (OSError, RuntimeError, ValueError) as exc:
+                print(f"Falha ao decodificar {audio_path}: {exc}")
+                failures += 1
+            break
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
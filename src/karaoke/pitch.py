@@ -1,10 +1,14 @@
 from __future__ import annotations
 
+import time
 from dataclasses import dataclass
-from typing import Optional
+from typing import Dict, Optional, Tuple, Type
 
 import numpy as np
 
+from .config import AudioConfig
+from .features import FrameFeatures
+
 
 @dataclass
 class PitchEstimate:
@@ -12,50 +16,265 @@ class PitchEstimate:
     confidence: float
 
 
-class PitchEstimator:
-    def __init__(self, sample_rate: int, min_freq: float, max_freq: float, corr_threshold: float):
+class PitchBackend:
+    name = ""
+
+    def __init__(self, sample_rate: int, min_freq: float, max_freq: float):
         self.sample_rate = sample_rate
         self.min_freq = min_freq
         self.max_freq = max_freq
-        self.corr_threshold = corr_threshold
+        self.busy_s = 0.0
+        self.blocks = 0
+        self.features = FrameFeatures()
+
+    @classmethod
+    def from_config(cls, config: AudioConfig) -> "PitchBackend":
+        raise NotImplementedError
+
+    @property
+    def cost_us_per_block(self) -> float:
+        if self.blocks == 0:
+            return 0.0
+        return self.busy_s * 1e6 / self.blocks
+
+    def reset_cost(self) -> None:
+        self.busy_s = 0.0
+        self.blocks = 0
 
     def estimate(self, frame: np.ndarray) -> PitchEstimate:
         if frame.size == 0:
             return PitchEstimate(None, 0.0)
 
-        x = frame.astype(np.float32)
-        x = x - np.mean(x)
-        peak = np.max(np.abs(x))
-        if peak < 1e-4:
-            return PitchEstimate(None, 0.0)
+        hz, confidence = self.estimate_batch(frame.reshape(1, -1))
+        value = float(hz[0])
+        return PitchEstimate(value if not np.isnan(value) else None, float(confidence[0]))
 
-        window = np.hanning(len(x))
-        x = x * window
+    def estimate_batch(self, frames: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return self.estimate_features(self.features.compute(frames))
 
-        spectrum = np.fft.rfft(x)
-        corr = np.fft.irfft(np.abs(spectrum) ** 2)
-        corr = corr[: len(corr) // 2]
-        if corr[0] <= 1e-9:
-            return PitchEstimate(None, 0.0)
-        corr = corr / corr[0]
+    def estimate_features(
+        self,
+        features: FrameFeatures,
+        rows: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # rows limita a analise a algumas janelas; as outras ficam sem pitch.
+        started = time.perf_counter()
+        count = features.count
+        hz = np.full(count, np.nan)
+        confidence = np.zeros(count)
+        if count and features.size:
+            audible = features.peak >= 1e-4
+            rows = np.flatnonzero(audible) if rows is None else rows[audible[rows]]
+            if len(rows):
+                hz[rows], confidence[rows] = self._analyze(features, rows if len(rows) < count else None)
+        self.busy_s += time.perf_counter() - started
+        self.blocks += count
+        return hz, confidence
 
+    def _lag_range(self, max_available: int) -> Tuple[int, int]:
         min_lag = int(self.sample_rate / self.max_freq)
         max_lag = int(self.sample_rate / self.min_freq)
-        max_lag = min(max_lag, len(corr) - 1)
+        return min_lag, min(max_lag, max_available)
+
+    def _analyze(self, features: FrameFeatures, rows: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        raise NotImplementedError
+
+
+class PitchEstimator(PitchBackend):
+    name = "autocorr"
+
+    def __init__(self, sample_rate: int, min_freq: float, max_freq: float, corr_threshold: float):
+        super().__init__(sample_rate, min_freq, max_freq)
+        self.corr_threshold = corr_threshold
+
+    @classmethod
+    def from_config(cls, config: AudioConfig) -> "PitchEstimator":
+        return cls(config.sample_rate, config.min_freq, config.max_freq, config.corr_threshold)
+
+    def _analyze(self, features: FrameFeatures, rows: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        # Usa o espectro com janela de Hann que o FrameFeatures ja calculou.
+        spectrum = features.spectrum(rows)
+        count = len(spectrum)
+        hz = np.full(count, np.nan)
+        confidence = np.zeros(count)
+
+        corr = np.fft.irfft(np.abs(spectrum) ** 2, axis=1)
+        corr = corr[:, : corr.shape[1] // 2]
+        energy = corr[:, 0]
+
+        min_lag, max_lag = self._lag_range(corr.shape[1] - 1)
         if max_lag <= min_lag + 2:
-            return PitchEstimate(None, 0.0)
+            return hz, confidence
+
+        rows = np.flatnonzero(energy > 1e-9)
+        if not len(rows):
+            return hz, confidence
+        corr = corr[rows] / energy[rows, None]
+
+        lag = np.argmax(corr[:, min_lag:max_lag], axis=1) + min_lag
+        picked = np.arange(len(rows))
+        best = corr[picked, lag]
+        confidence[rows] = best
+
+        voiced = best >= self.corr_threshold
+        rows = rows[voiced]
+        picked = picked[voiced]
+        lag = lag[voiced]
+
+        refined = lag.astype(np.float64)
+        inner = (lag >= 1) & (lag < corr.shape[1] - 1)
+        y0 = corr[picked[inner], lag[inner] - 1]
+        y1 = corr[picked[inner], lag[inner]]
+        y2 = corr[picked[inner], lag[inner] + 1]
+        denom = 2.0 * (2.0 * y1 - y0 - y2)
+        shift = np.zeros_like(denom)
+        usable = np.abs(denom) > 1e-6
+        shift[usable] = (y0[usable] - y2[usable]) / denom[usable]
+        refined[inner] += shift
+
+        positive = refined > 0
+        hz[rows[positive]] = self.sample_rate / refined[positive]
+        return hz, confidence
+
+
+class YinEstimator(PitchBackend):
+    name = "yin"
+
+    def __init__(self, sample_rate: int, min_freq: float, max_freq: float, threshold: float):
+        super().__init__(sample_rate, min_freq, max_freq)
+        self.threshold = threshold
+
+    @classmethod
+    def from_config(cls, config: AudioConfig) -> "YinEstimator":
+        return cls(config.sample_rate, config.min_freq, config.max_freq, config.yin_threshold)
+
+    def _analyze(self, features: FrameFeatures, rows: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        x = features.samples(rows)
+        count, size = x.shape
+        hz = np.full(count, np.nan)
+        confidence = np.zeros(count)
+        min_lag, max_lag = self._lag_range(size // 2)
+        if max_lag <= min_lag + 2:
+            return hz, confidence
+
+        # Funcao diferenca d(tau) sobre uma janela fixa, via FFT.
+        span = size - max_lag - 1
+        nfft = _next_pow2(size + span)
+        head = np.fft.rfft(x[:, :span], nfft, axis=1)
+        full = np.fft.rfft(x, nfft, axis=1)
+        cross = np.fft.irfft(np.conj(head) * full, nfft, axis=1)[:, : max_lag + 2]
+        squares = np.concatenate([np.zeros((count, 1)), np.cumsum(x.astype(np.float64) ** 2, axis=1)], axis=1)
+        taus = np.arange(max_lag + 2)
+        shifted = squares[:, taus + span] - squares[:, taus]
+        diff = squares[:, span, None] + shifted - 2.0 * cross
+        diff[:, 0] = 0.0
+
+        # Diferenca normalizada pela media acumulada (CMND).
+        running = np.cumsum(diff[:, 1:], axis=1)
+        cmnd = np.ones_like(diff)
+        np.divide(diff[:, 1:] * taus[1:], running, out=cmnd[:, 1:], where=running > 1e-12)
+
+        search = cmnd[:, min_lag : max_lag + 1]
+        below = search < self.threshold
+        found = np.any(below, axis=1)
+        first = np.argmax(below, axis=1)
+        rising = np.zeros_like(below)
+        rising[:, :-1] = search[:, 1:] >= search[:, :-1]
+        rising[:, -1] = True
+        positions = np.arange(search.shape[1])
+        lag = np.argmax(rising & (positions >= first[:, None]), axis=1)
+        lag = np.where(found, lag, np.argmin(search, axis=1)) + min_lag
+
+        rows = np.arange(count)
+        best = cmnd[rows, lag]
+        confidence[:] = np.clip(1.0 - best, 0.0, 1.0)
+
+        voiced = np.flatnonzero(found)
+        refined = lag[voiced] + _vertex_offset(cmnd, voiced, lag[voiced])
+        hz[voiced] = self.sample_rate / refined
+        return hz, confidence
+
+
+class MpmEstimator(PitchBackend):
+    name = "mpm"
+
+    def __init__(self, sample_rate: int, min_freq: float, max_freq: float, corr_threshold: float, cutoff: float):
+        super().__init__(sample_rate, min_freq, max_freq)
+        self.corr_threshold = corr_threshold
+        self.cutoff = cutoff
+
+    @classmethod
+    def from_config(cls, config: AudioConfig) -> "MpmEstimator":
+        return cls(config.sample_rate, config.min_freq, config.max_freq, config.corr_threshold, config.mpm_cutoff)
+
+    def _analyze(self, features: FrameFeatures, rows: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        x = features.samples(rows)
+        count, size = x.shape
+        hz = np.full(count, np.nan)
+        confidence = np.zeros(count)
+        min_lag, max_lag = self._lag_range(size // 2)
+        if max_lag <= min_lag + 2:
+            return hz, confidence
+
+        # Funcao de diferenca quadrada normalizada (NSDF).
+        nfft = _next_pow2(2 * size)
+        spectrum = np.fft.rfft(x, nfft, axis=1)
+        corr = np.fft.irfft(np.abs(spectrum) ** 2, nfft, axis=1)[:, : max_lag + 2]
+        squares = np.concatenate([np.zeros((count, 1)), np.cumsum(x.astype(np.float64) ** 2, axis=1)], axis=1)
+        taus = np.arange(max_lag + 2)
+        norm = squares[:, size - taus] + (squares[:, size, None] - squares[:, taus])
+        nsdf = np.zeros_like(corr)
+        np.divide(2.0 * corr, norm, out=nsdf, where=norm > 1e-12)
+
+        mid = nsdf[:, min_lag : max_lag + 1]
+        left = nsdf[:, min_lag - 1 : max_lag]
+        right = nsdf[:, min_lag + 1 : max_lag + 2]
+        peaks = (mid > 0.0) & (mid >= left) & (mid > right)
+        found = np.any(peaks, axis=1)
+        values = np.where(peaks, mid, -np.inf)
+        highest = np.max(values, axis=1)
+        chosen = np.argmax(peaks & (values >= self.cutoff * highest[:, None]), axis=1)
+        lag = chosen + min_lag
+
+        rows = np.arange(count)
+        clarity = np.where(found, nsdf[rows, lag], 0.0)
+        confidence[:] = clarity
+
+        voiced = np.flatnonzero(found & (clarity >= self.corr_threshold))
+        refined = lag[voiced] + _vertex_offset(nsdf, voiced, lag[voiced])
+        hz[voiced] = self.sample_rate / refined
+        return hz, confidence
+
+
+PITCH_BACKENDS: Dict[str, Type[PitchBackend]] = {
+    PitchEstimator.name: PitchEstimator,
+    YinEstimator.name: YinEstimator,
+    MpmEstimator.name: MpmEstimator,
+}
+
+
+def create_pitch_estimator(config: AudioConfig, backend: Optional[str] = None) -> PitchBackend:
+    # O registro e so o PITCH_BACKENDS; cada backend sabe ler a propria configuracao.
+    name = backend or config.pitch_backend
+    backend_cls = PITCH_BACKENDS.get(name)
+    if backend_cls is None:
+        raise ValueError(f"Backend de pitch desconhecido: {name}")
+    return backend_cls.from_config(config)
+
 
-        search = corr[min_lag:max_lag]
-        lag = int(np.argmax(search)) + min_lag
-        confidence = float(corr[lag])
-        if confidence < self.corr_threshold:
-            return PitchEstimate(None, confidence)
+def _vertex_offset(values: np.ndarray, rows: np.ndarray, lag: np.ndarray) -> np.ndarray:
+    offset = np.zeros(len(rows))
+    inner = (lag >= 1) & (lag < values.shape[1] - 1)
+    y0 = values[rows[inner], lag[inner] - 1]
+    y1 = values[rows[inner], lag[inner]]
+    y2 = values[rows[inner], lag[inner] + 1]
+    denom = y0 - 2.0 * y1 + y2
+    shift = np.zeros_like(denom)
+    usable = np.abs(denom) > 1e-12
+    shift[usable] = 0.5 * (y0[usable] - y2[usable]) / denom[usable]
+    offset[inner] = np.clip(shift, -0.5, 0.5)
+    return offset
 
-        if 1 <= lag < len(corr) - 1:
-            y0, y1, y2 = corr[lag - 1], corr[lag], corr[lag + 1]
-            denom = 2.0 * (2.0 * y1 - y0 - y2)
-            if abs(denom) > 1e-6:
-                lag = lag + (y0 - y2) / denom
 
-        hz = self.sample_rate / lag if lag > 0 else None
-        return PitchEstimate(hz, confidence)
+def _next_pow2(value: int) -> int:
+    return 1 << max(int(value) - 1, 1).bit_length()
@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+LOG_INTERVAL_S = 1.0
+SAMPLE_INTERVAL_S = 0.01
+HOT_LINES = 3
+SUMMARY_LINES = 15
+PROFILE_TOOLS = ("cprofile", "amostras")
+
+
+class StageTimes:
+    # Soma, pico e chamadas por etapa; vai inteiro pela fila do processo de analise.
+    def __init__(self):
+        self.total_s: Dict[str, float] = {}
+        self.max_s: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.calls)
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.total_s[stage] = self.total_s.get(stage, 0.0) + seconds
+        self.calls[stage] = self.calls.get(stage, 0) + 1
+        if seconds > self.max_s.get(stage, 0.0):
+            self.max_s[stage] = seconds
+
+    def lap(self, stage: str, started: float) -> float:
+        # Registra desde started e devolve o instante atual para encadear a proxima etapa.
+        now = time.perf_counter()
+        self.add(stage, now - started)
+        return now
+
+    def merge(self, other: "StageTimes") -> None:
+        for stage, calls in other.calls.items():
+            self.total_s[stage] = self.total_s.get(stage, 0.0) + other.total_s[stage]
+            self.calls[stage] = self.calls.get(stage, 0) + calls
+            self.max_s[stage] = max(self.max_s.get(stage, 0.0), other.max_s[stage])
+
+    def clear(self) -> None:
+        self.total_s.clear()
+        self.max_s.clear()
+        self.calls.clear()
+
+    def summary(self, wall_s: float) -> Dict[str, Dict[str, float]]:
+        return {
+            stage: {
+                "calls": calls,
+                "mean_ms": self.total_s[stage] / calls * 1000.0,
+                "max_ms": self.max_s[stage] * 1000.0,
+                # Fracao de um nucleo gasta na etapa.
+                "share": self.total_s[stage] / wall_s if wall_s > 0.0 else 0.0,
+            }
+            for stage, calls in self.calls.items()
+        }
+
+
+class _Series:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class Profiler:
+    def __init__(self, log_path: Optional[Path] = None, tool: Optional[str] = None, interval_s: float = LOG_INTERVAL_S):
+        self.stages = StageTimes()
+        self.totals = StageTimes()
+        self.interval_s = interval_s
+        self.log_path = log_path
+        self.tool = tool
+        self.song = ""
+        self.quality = ""
+        # Linhas para o overlay; a lista so e trocada a cada relatorio.
+        self.lines: List[str] = []
+        self.reports = 0
+        self._log = log_path.open("a", encoding="utf-8") if log_path else None
+        self._started = time.perf_counter()
+        self._interval_at = self._started
+        self._last_tick: Optional[float] = None
+        self._read_count: Optional[int] = None
+        self._dropped: Optional[Tuple[int, int]] = None
+        self._dropped_total = [0, 0]
+        self._reset_interval()
+        self._worst_frame_s = 0.0
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._hot: Counter = Counter()
+        self._hot_total: Counter = Counter()
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        if tool is not None and tool not in PROFILE_TOOLS:
+            raise ValueError(f"Ferramenta de perfil desconhecida: {tool}")
+
+    def start(self) -> None:
+        # cProfile e amostras so olham a thread principal (UI, pontuacao e analise local).
+        if self.tool == "cprofile":
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        elif self.tool == "amostras":
+            self._sampler = threading.Thread(target=self._sample, name="karaoke-profile", daemon=True)
+            self._sampler.start()
+
+    def lap(self, stage: str, started: float) -> float:
+        return self.stages.lap(stage, started)
+
+    def tick(self, now: float, busy_s: float, read_count: int, queued: int, overruns: int, dropped_frames: int) -> bool:
+        # Uma chamada por volta do laco principal; devolve True quando fecha um intervalo.
+        if self._last_tick is not None:
+            frame_s = now - self._last_tick
+            self._frame.add(frame_s)
+            self._worst_frame_s = max(self._worst_frame_s, frame_s)
+        self._last_tick = now
+        self._busy.add(busy_s)
+        if self._read_count is not None:
+            self._blocks.add(read_count - self._read_count)
+        self._read_count = read_count
+        self._queue.add(queued)
+        if self._dropped is None:
+            self._dropped = (overruns, dropped_frames)
+        if now - self._interval_at < self.interval_s:
+            return False
+        self._report(now, overruns, dropped_frames)
+        return True
+
+    def close(self) -> List[str]:
+        # Para as ferramentas, fecha o log e devolve o resumo da execucao inteira.
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        wall_s = time.perf_counter() - self._started
+        self.totals.merge(self.stages)
+        lines = [
+            f"Pior quadro {self._worst_frame_s * 1000.0:.1f} ms, "
+            f"{self._dropped_total[0]} blocos ({self._dropped_total[1]} amostras) perdidos"
+        ]
+        lines.extend(_stage_lines(self.totals.summary(wall_s)))
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            lines.extend(self._dump_cprofile())
+        if self._hot_total:
+            samples = sum(self._hot_total.values())
+            lines.append(f"Amostras da thread principal ({samples}):")
+            lines.extend(
+                f"  {count / samples:5.1%}  {where}" for where, count in self._hot_total.most_common(SUMMARY_LINES)
+            )
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        return lines
+
+    def _report(self, now: float, overruns: int, dropped_frames: int) -> None:
+        wall_s = now - self._interval_at
+        stages = self.stages.summary(wall_s)
+        lost_blocks = overruns - self._dropped[0]
+        lost_frames = dropped_frames - self._dropped[1]
+        self._dropped_total[0] += lost_blocks
+        self._dropped_total[1] += lost_frames
+        hot, self._hot = self._hot, Counter()
+        self._hot_total.update(hot)
+        samples = sum(hot.values())
+        top = [(where, count / samples) for where, count in hot.most_common(HOT_LINES)] if samples else []
+
+        fps = self._frame.count / wall_s if wall_s > 0.0 else 0.0
+        lines = [
+            f"Quadro {self._frame.mean * 1000.0:5.1f} ms (max {self._frame.max * 1000.0:5.1f})  {fps:4.1f} fps"
+            f"  ocupado {self._busy.mean * 1000.0:4.1f} ms",
+            f"Blocos/volta {self._blocks.mean:3.1f} (max {self._blocks.max:.0f})  fila {self._queue.mean:3.1f}"
+            f" (max {self._queue.max:.0f})  perdidos {lost_blocks}",
+        ]
+        lines.extend(_stage_lines(stages))
+        lines.extend(f"{share:4.0%} {where}" for where, share in top)
+        self.lines = lines
+
+        if self._log is not None:
+            record = {
+                "time_s": round(now - self._started, 3),
+                "song": self.song,
+                "quality": self.quality,
+                "frames": self._frame.count,
+                "frame_ms": {"mean": self._frame.mean * 1000.0, "max": self._frame.max * 1000.0},
+                "busy_ms": {"mean": self._busy.mean * 1000.0, "max": self._busy.max * 1000.0},
+                "blocks_per_tick": {"mean": self._blocks.mean, "max": self._blocks.max},
+                "queue_blocks": {"mean": self._queue.mean, "max": self._queue.max},
+                "dropped_blocks": lost_blocks,
+                "dropped_frames": lost_frames,
+                "stages": stages,
+                "hot": top,
+            }
+            self._log.write(json.dumps(record) + "\n")
+            self._log.flush()
+
+        self.totals.merge(self.stages)
+        self.stages.clear()
+        self._reset_interval()
+        self._dropped = (overruns, dropped_frames)
+        self._interval_at = now
+        self.reports += 1
+
+    def _reset_interval(self) -> None:
+        self._frame = _Series()
+        self._busy = _Series()
+        self._blocks = _Series()
+        self._queue = _Series()
+
+    def _sample(self) -> None:
+        # Amostra a linha em execucao na thread principal; custa um acesso aos frames a cada 10 ms.
+        main_id = threading.main_thread().ident
+        while not self._stop.wait(SAMPLE_INTERVAL_S):
+            frame = sys._current_frames().get(main_id)
+            if frame is None:
+                continue
+            code = frame.f_code
+            self._hot[f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"] += 1
+
+    def _dump_cprofile(self) -> List[str]:
+        path = self.log_path.with_suffix(".prof") if self.log_path else Path("perfil.prof")
+        self._cprofile.dump_stats(str(path))
+        output = io.StringIO()
+        stats = pstats.Stats(self._cprofile, stream=output)
+        stats.sort_stats("cumulative").print_stats(SUMMARY_LINES)
+        lines = [f"cProfile salvo em {path} (top {SUMMARY_LINES} por tempo acumulado):"]
+        lines.extend(f"  {line}" for line in output.getvalue().splitlines() if line.strip())
+        return lines
+
+
+def _stage_lines(stages: Dict[str, Dict[str, float]]) -> List[str]:
+    return [
+        f"{name:<10} {stats['mean_ms']:6.2f} ms  max {stats['max_ms']:6.2f}  {stats['share']:4.0%}"
+        for name, stats in stages.items()
+    ]
@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+from bisect import bisect_left
 from dataclasses import dataclass
-from typing import List, Optional, Tuple
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
 
 from .config import ScoringConfig
-from .melody import ReferenceNote
+from .melody import Melody, ReferenceNote
 from .tracking import UserNote
 
 
@@ -22,36 +25,101 @@ def score_notes(
     users: List[UserNote],
     config: ScoringConfig,
 ) -> ScoreBreakdown:
-    if not references:
+    ref_start = np.array([ref.start_s for ref in references], dtype=np.float64)
+    ref_end = np.array([ref.end_s for ref in references], dtype=np.float64)
+    ref_midi = np.array([ref.midi for ref in references], dtype=np.float64)
+    return _score_arrays(ref_start, ref_end, ref_midi, users, config)
+
+
+def score_melody(melody: Melody, users: List[UserNote], config: ScoringConfig) -> ScoreBreakdown:
+    return _score_arrays(melody.start_s, melody.end_s, melody.midi, users, config)
+
+
+def _score_arrays(
+    ref_start: np.ndarray,
+    ref_end: np.ndarray,
+    ref_midi: np.ndarray,
+    users: List[UserNote],
+    config: ScoringConfig,
+) -> ScoreBreakdown:
+    total_notes = len(ref_start)
+    if not total_notes:
         return ScoreBreakdown(0.0, 0.0, 0.0, 0, 0)
+    if not users:
+        return _breakdown(0, 0.0, 0.0, total_notes, config)
 
-    used = [False] * len(users)
-    pitch_scores: List[float] = []
-    rhythm_scores: List[float] = []
-    matched = 0
+    tol = config.rhythm_tolerance_s
+    user_start = np.array([user.start_s for user in users], dtype=np.float64)
+    user_end = np.array([user.end_s for user in users], dtype=np.float64)
+    user_midi = np.array([user.midi for user in users], dtype=np.float64)
 
-    for ref in references:
-        match = _find_match(ref, users, used, config.rhythm_tolerance_s)
-        if match is None:
+    # Candidatos de cada referencia: notas do usuario com inicio <= fim + tol e fim >= inicio - tol,
+    # achados por busca binaria nos inicios e no maior fim acumulado (as notas podem se sobrepor).
+    order = np.argsort(user_start, kind="stable")
+    end_max = np.maximum.accumulate(user_end[order])
+    high = np.searchsorted(user_start[order], ref_end + tol, side="right")
+    low = np.searchsorted(end_max, ref_start - tol, side="left")
+    counts = np.maximum(high - low, 0)
+    refs = np.repeat(np.arange(total_notes), counts)
+    offsets = np.arange(len(refs)) - np.repeat(np.cumsum(counts) - counts, counts)
+    candidates = order[np.repeat(low, counts) + offsets]
+    keep = user_end[candidates] >= ref_start[refs] - tol
+    refs = refs[keep]
+    candidates = candidates[keep]
+    delta = np.abs(user_start[candidates] - ref_start[refs])
+
+    # Na ordem das referencias, cada uma fica com o candidato livre mais proximo (empate: a nota mais antiga).
+    ranked = np.lexsort((candidates, delta, refs))
+    used = [False] * len(users)
+    matched_refs: List[int] = []
+    matched_users: List[int] = []
+    matched_delta: List[float] = []
+    current = -1
+    for ref, user, gap in zip(refs[ranked].tolist(), candidates[ranked].tolist(), delta[ranked].tolist()):
+        if ref == current or used[user]:
             continue
-        idx, user = match
-        used[idx] = True
-        matched += 1
+        used[user] = True
+        current = ref
+        matched_refs.append(ref)
+        matched_users.append(user)
+        matched_delta.append(gap)
+
+    if not matched_refs:
+        return _breakdown(0, 0.0, 0.0, total_notes, config)
+    cents_error = np.abs(user_midi[matched_users] - ref_midi[matched_refs]) * 100.0
+    pitch_scores = np.maximum(0.0, 1.0 - cents_error / config.pitch_tolerance_cents)
+    rhythm_scores = np.maximum(0.0, 1.0 - np.array(matched_delta) / config.rhythm_tolerance_s)
+    # Soma na ordem das referencias, como o placar incremental.
+    return _breakdown(
+        len(matched_refs),
+        sum(pitch_scores.tolist()),
+        sum(rhythm_scores.tolist()),
+        total_notes,
+        config,
+    )
+
 
-        cents_error = abs(user.midi - ref.midi) * 100.0
-        pitch_score = max(0.0, 1.0 - (cents_error / config.pitch_tolerance_cents))
+def _note_scores(ref_start: float, ref_midi: float, user: UserNote, config: ScoringConfig) -> Tuple[float, float]:
+    cents_error = abs(user.midi - ref_midi) * 100.0
+    pitch_score = max(0.0, 1.0 - (cents_error / config.pitch_tolerance_cents))
 
-        time_error = abs(user.start_s - ref.start_s)
-        rhythm_score = max(0.0, 1.0 - (time_error / config.rhythm_tolerance_s))
+    time_error = abs(user.start_s - ref_start)
+    rhythm_score = max(0.0, 1.0 - (time_error / config.rhythm_tolerance_s))
+    return pitch_score, rhythm_score
 
-        pitch_scores.append(pitch_score)
-        rhythm_scores.append(rhythm_score)
 
+def _breakdown(
+    matched: int,
+    pitch_sum: float,
+    rhythm_sum: float,
+    total_notes: int,
+    config: ScoringConfig,
+) -> ScoreBreakdown:
     if matched == 0:
-        return ScoreBreakdown(0.0, 0.0, 0.0, 0, len(references))
+        return ScoreBreakdown(0.0, 0.0, 0.0, 0, total_notes)
 
-    pitch_avg = sum(pitch_scores) / matched
-    rhythm_avg = sum(rhythm_scores) / matched
+    pitch_avg = pitch_sum / matched
+    rhythm_avg = rhythm_sum / matched
     total = (
         (pitch_avg * config.pitch_weight + rhythm_avg * config.rhythm_weight)
         / (config.pitch_weight + config.rhythm_weight)
@@ -62,33 +130,165 @@ def score_notes(
         pitch=pitch_avg * 100.0,
         rhythm=rhythm_avg * 100.0,
         matched=matched,
-        total_notes=len(references),
+        total_notes=total_notes,
     )
 
 
-def _find_match(
-    ref: ReferenceNote,
-    users: List[UserNote],
-    used: List[bool],
-    tol: float,
-) -> Optional[Tuple[int, UserNote]]:
-    candidates: List[Tuple[int, UserNote, float]] = []
-    ref_start = ref.start_s
-    ref_end = ref.end_s
-
-    for idx, user in enumerate(users):
-        if used[idx]:
-            continue
-        if user.end_s < ref_start - tol:
-            continue
-        if user.start_s > ref_end + tol:
-            continue
-        delta = abs(user.start_s - ref_start)
-        candidates.append((idx, user, delta))
+class IncrementalScorer:
+    def __init__(
+        self,
+        ref_start: Sequence[float],
+        ref_end: Sequence[float],
+        ref_midi: Sequence[float],
+        config: ScoringConfig,
+    ):
+        # Listas de floats: o laco le uma referencia por vez, mais rapido que indexar arrays numpy.
+        self._ref_start = np.asarray(ref_start, dtype=np.float64).tolist()
+        self._ref_end = np.asarray(ref_end, dtype=np.float64).tolist()
+        self._ref_midi = np.asarray(ref_midi, dtype=np.float64).tolist()
+        self.config = config
+        self._suffix_min_start = _suffix_min_starts(self._ref_start)
+
+        self._pool: List[UserNote] = []
+        self._pool_starts: List[float] = []
+        self._last_start: Optional[float] = None
+        self._max_end = float("-inf")
+
+        self._next_ref = 0
+        self._matched = 0
+        self._pitch_sum = 0.0
+        self._rhythm_sum = 0.0
+        self._cached: Optional[ScoreBreakdown] = None
+
+    @classmethod
+    def from_notes(cls, references: List[ReferenceNote], config: ScoringConfig) -> "IncrementalScorer":
+        return cls(
+            [ref.start_s for ref in references],
+            [ref.end_s for ref in references],
+            [ref.midi for ref in references],
+            config,
+        )
+
+    @classmethod
+    def from_melody(cls, melody: Melody, config: ScoringConfig) -> "IncrementalScorer":
+        # Direto dos arrays da melodia (views do cache), sem criar um ReferenceNote por nota.
+        return cls(melody.start_s, melody.end_s, melody.midi, config)
+
+    def add(self, notes: List[UserNote]) -> None:
+        for note in notes:
+            self._add_one(note)
+        if notes:
+            self._settle()
+            self._cached = None
+
+    def result(self) -> ScoreBreakdown:
+        if self._cached is not None:
+            return self._cached
+        if not self._ref_start:
+            self._cached = ScoreBreakdown(0.0, 0.0, 0.0, 0, 0)
+            return self._cached
+
+        tol = self.config.rhythm_tolerance_s
+        matched = self._matched
+        pitch_sum = self._pitch_sum
+        rhythm_sum = self._rhythm_sum
+        taken: set = set()
+        for idx in range(self._next_ref, len(self._ref_start)):
+            if self._suffix_min_start[idx] - tol > self._max_end:
+                break
+            pos = self._find(idx, taken)
+            if pos is None:
+                continue
+            taken.add(pos)
+            pitch_score, rhythm_score = _note_scores(
+                self._ref_start[idx], self._ref_midi[idx], self._pool[pos], self.config
+            )
+            matched += 1
+            pitch_sum += pitch_score
+            rhythm_sum += rhythm_score
+
+        self._cached = _breakdown(matched, pitch_sum, rhythm_sum, len(self._ref_start), self.config)
+        return self._cached
+
+    def _add_one(self, note: UserNote) -> None:
+        if self._last_start is not None and note.start_s < self._last_start:
+            raise ValueError("Notas do usuario devem chegar em ordem de inicio.")
+        self._last_start = note.start_s
+        self._max_end = max(self._max_end, note.end_s)
+        self._pool.append(note)
+        self._pool_starts.append(note.start_s)
+
+    def _settle(self) -> None:
+        # Uma nota de referencia so pode ser decidida quando nenhuma nota futura
+        # do usuario pode mais entrar na sua janela (inicios chegam em ordem).
+        tol = self.config.rhythm_tolerance_s
+        while self._next_ref < len(self._ref_start):
+            idx = self._next_ref
+            if self._last_start is None or self._last_start <= self._ref_end[idx] + tol:
+                break
+            pos = self._find(idx, None)
+            if pos is not None:
+                pitch_score, rhythm_score = _note_scores(
+                    self._ref_start[idx], self._ref_midi[idx], self._pool[pos], self.config
+                )
+                self._matched += 1
+                self._pitch_sum += pitch_score
+                self._rhythm_sum += rhythm_score
+                del self._pool[pos]
+                del self._pool_starts[pos]
+            self._next_ref += 1
+            self._prune()
+
+    def _prune(self) -> None:
+        if self._next_ref >= len(self._ref_start):
+            cutoff = float("inf")
+        else:
+            cutoff = self._suffix_min_start[self._next_ref] - self.config.rhythm_tolerance_s
+        head = 0
+        while head < len(self._pool) and self._pool[head].end_s < cutoff:
+            head += 1
+        if head:
+            del self._pool[:head]
+            del self._pool_starts[:head]
+
+    def _find(self, idx: int, taken: Optional[set]) -> Optional[int]:
+        tol = self.config.rhythm_tolerance_s
+        ref_start = self._ref_start[idx]
+        low = ref_start - tol
+        high = self._ref_end[idx] + tol
+        split = bisect_left(self._pool_starts, ref_start)
+
+        best: Optional[int] = None
+        best_delta = float("inf")
+        for pos in range(split - 1, -1, -1):
+            user = self._pool[pos]
+            delta = abs(user.start_s - ref_start)
+            if delta > best_delta:
+                break
+            if (taken and pos in taken) or user.end_s < low or user.start_s > high:
+                continue
+            # Empates ficam com a nota mais antiga, como em score_notes.
+            best, best_delta = pos, delta
+
+        for pos in range(split, len(self._pool)):
+            user = self._pool[pos]
+            if user.start_s > high:
+                break
+            delta = abs(user.start_s - ref_start)
+            if delta >= best_delta:
+                break
+            if (taken and pos in taken) or user.end_s < low:
+                continue
+            best, best_delta = pos, delta
+            break
+
+        return best
 
-    if not candidates:
-        return None
 
-    candidates.sort(key=lambda item: item[2])
-    idx, user, _ = candidates[0]
-    return idx, user
+def _suffix_min_starts(starts: List[float]) -> List[float]:
+    output = [0.0] * len(starts)
+    current = float("inf")
+    for idx in range(len(starts) - 1, -1, -1):
+        current = min(current, starts[idx])
+        output[idx] = current
+    return output
@@ -1,11 +1,14 @@
 from __future__ import annotations
 
 import json
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from .lyrics import Lyrics
+import numpy as np
+
+from . import songcache
+from .lyrics import LyricLine, Lyrics
 from .melody import Melody
 
 
@@ -18,9 +21,11 @@ class Song:
     title: str
     artist: Optional[str] = None
     audio_offset_s: float = 0.0
+    melodies: List[Melody] = field(default_factory=list)
+    singers: List[str] = field(default_factory=list)
 
     @classmethod
-    def from_dir(cls, path: Path) -> "Song":
+    def from_dir(cls, path: Path, use_cache: bool = True) -> "Song":
         root = path
         audio_path = None
         for name in ("audio.wav", "audio.ogg", "audio.mp3"):
@@ -39,20 +44,79 @@ class Song:
             raise FileNotFoundError("Nao achei melody.csv")
 
         meta_path = root / "meta.json"
-        meta = {}
-        if meta_path.exists():
-            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        duet_path = root / "melody_p2.csv"
+        sources = (melody_path, lyrics_path, meta_path, duet_path)
+        cached = songcache.load(root, sources) if use_cache else None
+        if cached is not None:
+            meta = cached.meta
+            melodies = []
+            offset = 0
+            for count in cached.singer_notes:
+                end = offset + count
+                melodies.append(
+                    Melody.from_arrays(
+                        cached.note_start[offset:end],
+                        cached.note_duration[offset:end],
+                        cached.note_end[offset:end],
+                        cached.note_midi[offset:end],
+                    )
+                )
+                offset = end
+            lyrics = Lyrics(
+                [LyricLine(time_s, text) for time_s, text in zip(cached.lyric_times.tolist(), cached.lyric_texts)]
+            )
+        else:
+            meta = {}
+            if meta_path.exists():
+                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            melodies = [Melody.from_csv(melody_path)]
+            if duet_path.exists():
+                melodies.append(Melody.from_csv(duet_path))
+            lyrics = Lyrics.from_lrc(lyrics_path)
+            if use_cache:
+                _write_cache(root, sources, meta, melodies, lyrics)
 
         title = meta.get("title", root.name)
         artist = meta.get("artist")
         audio_offset_s = float(meta.get("audio_offset_s", 0.0))
+        singers = list(meta.get("singers") or [])
+        singers += [f"Cantor {index + 1}" for index in range(len(singers), len(melodies))]
 
         return cls(
             root=root,
             audio_path=audio_path,
-            lyrics=Lyrics.from_lrc(lyrics_path),
-            melody=Melody.from_csv(melody_path),
+            lyrics=lyrics,
+            melody=melodies[0],
             title=title,
             artist=artist,
             audio_offset_s=audio_offset_s,
+            melodies=melodies,
+            singers=singers[: len(melodies)],
         )
+
+    def melody_for(self, singer: int) -> Melody:
+        # Com mais cantores que partes, todos cantam a mesma melodia.
+        if len(self.melodies) > 1 and singer < len(self.melodies):
+            return self.melodies[singer]
+        return self.melody
+
+
+def _write_cache(
+    root: Path,
+    sources: Tuple[Path, ...],
+    meta: Dict[str, Any],
+    melodies: List[Melody],
+    lyrics: Lyrics,
+) -> None:
+    songcache.save(
+        root,
+        sources,
+        meta,
+        note_start=np.concatenate([melody.start_s for melody in melodies]),
+        note_duration=np.concatenate([melody.duration_s for melody in melodies]),
+        note_end=np.concatenate([melody.end_s for melody in melodies]),
+        note_midi=np.concatenate([melody.midi for melody in melodies]),
+        lyric_times=np.array([line.time_s for line in lyrics.lines], dtype=np.float64),
+        lyric_texts=[line.text for line in lyrics.lines],
+        singer_notes=[len(melody) for melody in melodies],
+    )
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+CACHE_NAME = ".song.cache"
+_MAGIC = b"KSC3"
+_HEADER = struct.Struct("<4sI")
+
+
+@dataclass
+class CachedSong:
+    meta: Dict[str, Any]
+    note_start: np.ndarray
+    note_duration: np.ndarray
+    note_end: np.ndarray
+    note_midi: np.ndarray
+    lyric_times: np.ndarray
+    lyric_texts: List[str]
+    singer_notes: List[int]
+
+
+def signature(sources: Sequence[Path]) -> List[List[int]]:
+    output: List[List[int]] = []
+    for path in sources:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            output.append([-1, -1])
+            continue
+        output.append([stat.st_mtime_ns, stat.st_size])
+    return output
+
+
+def load(root: Path, sources: Sequence[Path]) -> Optional[CachedSong]:
+    path = root / CACHE_NAME
+    try:
+        with path.open("rb") as handle:
+            data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    try:
+        magic, header_len = _HEADER.unpack_from(data, 0)
+        if magic != _MAGIC:
+            return None
+        header = json.loads(bytes(data[_HEADER.size : _HEADER.size + header_len]).decode("utf-8"))
+        if header.get("signature") != signature(sources):
+            return None
+
+        offset = _align(_HEADER.size + header_len)
+        singer_notes = [int(count) for count in header["singer_notes"]]
+        notes = sum(singer_notes)
+        lines = int(header["lines"])
+        # Arrays apontam direto para o mmap, sem copiar.
+        arrays = []
+        for count in (notes, notes, notes, notes, lines):
+            arrays.append(np.frombuffer(data, dtype="<f8", count=count, offset=offset))
+            offset += 8 * count
+    except (ValueError, KeyError, struct.error):
+        return None
+
+    return CachedSong(
+        meta=header["meta"],
+        note_start=arrays[0],
+        note_duration=arrays[1],
+        note_end=arrays[2],
+        note_midi=arrays[3],
+        lyric_times=arrays[4],
+        lyric_texts=header["texts"],
+        singer_notes=singer_notes,
+    )
+
+
+def save(
+    root: Path,
+    sources: Sequence[Path],
+    meta: Dict[str, Any],
+    note_start: np.ndarray,
+    note_duration: np.ndarray,
+    note_end: np.ndarray,
+    note_midi: np.ndarray,
+    lyric_times: np.ndarray,
+    lyric_texts: List[str],
+    singer_notes: Optional[List[int]] = None,
+) -> None:
+    header = {
+        "signature": signature(sources),
+        "meta": meta,
+        "singer_notes": singer_notes or [len(note_start)],
+        "lines": len(lyric_times),
+        "texts": lyric_texts,
+    }
+    encoded = json.dumps(header, ensure_ascii=True).encode("utf-8")
+    prefix = _HEADER.pack(_MAGIC, len(encoded)) + encoded
+    prefix += b"\0" * (_align(len(prefix)) - len(prefix))
+
+    target = root / CACHE_NAME
+    temp = root / (CACHE_NAME + ".tmp")
+    try:
+        with temp.open("wb") as handle:
+            handle.write(prefix)
+            # O fim vai pronto para a Melody usar o mmap direto, sem somar inicio + duracao.
+            for values in (note_start, note_duration, note_end, note_midi, lyric_times):
+                handle.write(np.ascontiguousarray(values, dtype="<f8").tobytes())
+        os.replace(temp, target)
+    except OSError:
+        try:
+            temp.unlink()
+        except OSError:
+            pass
+
+
+def _align(size: int) -> int:
+    return (size + 7) // 8 * 8
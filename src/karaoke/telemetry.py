@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+# Cada etapa guarda a idade do audio (desde o ADC) quando a etapa terminou.
+STAGES = ("callback", "fila", "pitch", "nota", "pontuacao", "tela")
+WINDOW = 4096
+HISTOGRAM_EDGES_MS = np.geomspace(0.1, 10000.0, 51)
+
+
+class RollingHistogram:
+    def __init__(self, window: int = WINDOW):
+        self._values = np.zeros(window, dtype=np.float64)
+        self.count = 0
+        self.max_ms = 0.0
+
+    def add(self, value_ms: float) -> None:
+        self._values[self.count % len(self._values)] = value_ms
+        self.count += 1
+        if value_ms > self.max_ms:
+            self.max_ms = value_ms
+
+    def window(self) -> np.ndarray:
+        return self._values[: min(self.count, len(self._values))]
+
+    def percentiles(self, quantiles: Iterable[float] = (50.0, 95.0, 99.0)) -> List[float]:
+        values = self.window()
+        if not len(values):
+            return [0.0 for _ in quantiles]
+        return np.percentile(values, list(quantiles)).tolist()
+
+    def histogram(self) -> List[int]:
+        counts, _ = np.histogram(np.clip(self.window(), HISTOGRAM_EDGES_MS[0], HISTOGRAM_EDGES_MS[-1]), HISTOGRAM_EDGES_MS)
+        return counts.tolist()
+
+
+class LatencyTelemetry:
+    def __init__(self, window: int = WINDOW):
+        self.window = window
+        self.stages: Dict[str, RollingHistogram] = {name: RollingHistogram(window) for name in STAGES}
+
+    def record(self, stage: str, age_s: float) -> None:
+        self.stages[stage].add(max(age_s, 0.0) * 1000.0)
+
+    def record_many(self, samples: Iterable[Tuple[str, float]]) -> None:
+        for stage, age_s in samples:
+            self.record(stage, age_s)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        output: Dict[str, Dict[str, float]] = {}
+        for name, histogram in self.stages.items():
+            if not histogram.count:
+                continue
+            p50, p95, p99 = histogram.percentiles()
+            output[name] = {
+                "count": histogram.count,
+                "p50_ms": p50,
+                "p95_ms": p95,
+                "p99_ms": p99,
+                "max_ms": histogram.max_ms,
+            }
+        return output
+
+    def lines(self) -> List[str]:
+        return [
+            f"{name:<10} p50 {stats['p50_ms']:6.1f}  p95 {stats['p95_ms']:6.1f}  p99 {stats['p99_ms']:6.1f} ms"
+            for name, stats in self.summary().items()
+        ]
+
+    def dump(self, path: Path) -> None:
+        data = {
+            "window": self.window,
+            "edges_ms": HISTOGRAM_EDGES_MS.tolist(),
+            "stages": {
+                name: dict(stats, histogram=self.stages[name].histogram()) for name, stats in self.summary().items()
+            },
+        }
+        path.write_text(json.dumps(data, indent=2) + "\n", encoding="utf-8")
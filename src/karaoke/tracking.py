@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import math
 from dataclasses import dataclass, field
 from typing import List, Optional
 
@@ -8,6 +9,9 @@ import numpy as np
 from .config import NoteTrackingConfig
 from .dsp import hz_to_midi, rms
 
+# Constante de tempo da media movel do piso de ruido (~0.02 por bloco de 1024 a 44.1 kHz).
+NOISE_FLOOR_TAU_S = 1.15
+
 
 @dataclass
 class UserNote:
@@ -32,12 +36,16 @@ class NoteTracker:
         self.config = config
         self.noise_floor = 0.0
         self.active: Optional[_ActiveNote] = None
+        self._last_time: Optional[float] = None
 
     def process(self, time_s: float, frame: np.ndarray, pitch_hz: Optional[float]) -> List[UserNote]:
+        return self.process_rms(time_s, rms(frame), pitch_hz)
+
+    def process_rms(self, time_s: float, frame_rms: float, pitch_hz: Optional[float]) -> List[UserNote]:
+        # Para quem ja tem o RMS da janela (FrameFeatures) e nao precisa passar as amostras de novo.
         notes: List[UserNote] = []
-        frame_rms = rms(frame)
-        self._update_noise_floor(frame_rms)
-        threshold = max(self.noise_floor * self.config.energy_multiplier, 0.003)
+        self._update_noise_floor(frame_rms, time_s)
+        threshold = self.threshold
 
         midi = hz_to_midi(pitch_hz) if pitch_hz else None
         voiced = midi is not None and frame_rms >= threshold
@@ -55,6 +63,10 @@ class NoteTracker:
 
         return notes
 
+    @property
+    def threshold(self) -> float:
+        return max(self.noise_floor * self.config.energy_multiplier, 0.003)
+
     def flush(self) -> List[UserNote]:
         if self.active is None:
             return []
@@ -76,9 +88,14 @@ class NoteTracker:
         midi = float(np.median(midi_values))
         return UserNote(start_s=start_s, end_s=end_s, midi=midi)
 
-    def _update_noise_floor(self, frame_rms: float) -> None:
+    def _update_noise_floor(self, frame_rms: float, time_s: float) -> None:
+        previous = self._last_time
+        self._last_time = time_s
         if self.noise_floor == 0.0:
             self.noise_floor = frame_rms
             return
-        alpha = 0.02
+        if previous is None or time_s <= previous:
+            return
+        # O passo vem do intervalo real entre janelas: vale para qualquer hop, taxa ou modo barato.
+        alpha = 1.0 - math.exp(-(time_s - previous) / NOISE_FLOOR_TAU_S)
         self.noise_floor = (1.0 - alpha) * self.noise_floor + alpha * frame_rms
@@ -1,10 +1,34 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Optional
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
 
 import pygame
 
+from .lane import LANE_MIN_HEIGHT, NoteLane
+from .melody import Melody
+from .profiling import StageTimes
+
+TEXT_CACHE_LIMIT = 256
+PRELOAD_LINES = 32
+TITLE_COLOR = (240, 240, 240)
+LINE_COLOR = (255, 236, 156)
+NEXT_COLOR = (190, 190, 190)
+SINGER_COLORS = ((180, 220, 255), (255, 190, 150), (170, 240, 170), (230, 180, 250))
+PROFILE_COLOR = (255, 210, 120)
+PROFILE_BG = (0, 0, 0)
+
+TextKey = Tuple[int, str, Tuple[int, int, int]]
+
+
+@dataclass
+class SingerScore:
+    name: str
+    total: float
+    notes_done: int
+    notes_total: int
+
 
 @dataclass
 class UIState:
@@ -17,10 +41,17 @@ class UIState:
     score_rhythm: float
     notes_done: int
     notes_total: int
+    singers: List[SingerScore] = field(default_factory=list)
+    overlay: List[str] = field(default_factory=list)
+    # Tempo da musica na faixa de notas e pitch atual (Hz ou None) de cada cantor.
+    lane_time_s: Optional[float] = None
+    pitch_hz: List[Optional[float]] = field(default_factory=list)
+    # Estatisticas do --profile; F3 mostra/esconde.
+    profile: List[str] = field(default_factory=list)
 
 
 class PygameUI:
-    def __init__(self, fullscreen: bool = False, size: tuple[int, int] | None = None):
+    def __init__(self, fullscreen: bool = False, size: tuple[int, int] | None = None, fps: int = 30):
         pygame.init()
         flags = pygame.FULLSCREEN if fullscreen else 0
         if size is None:
@@ -30,30 +61,113 @@ class PygameUI:
         pygame.display.set_caption("Karaoke com Nota")
 
         self.clock = pygame.time.Clock()
+        self.fps = fps
         self.width, self.height = self.screen.get_size()
         self.font_title = pygame.font.SysFont("DejaVu Sans", 48, bold=True)
         self.font_line = pygame.font.SysFont("DejaVu Sans", 52, bold=True)
         self.font_next = pygame.font.SysFont("DejaVu Sans", 34)
         self.font_meta = pygame.font.SysFont("DejaVu Sans", 28)
+        self.font_debug = pygame.font.SysFont("DejaVu Sans Mono", 16)
+        # Copias das fontes para a thread de pre-carga (SDL_ttf nao aceita a mesma fonte em duas threads).
+        self._preload_fonts = (
+            (self.font_title, pygame.font.SysFont("DejaVu Sans", 48, bold=True), TITLE_COLOR),
+            (self.font_line, pygame.font.SysFont("DejaVu Sans", 52, bold=True), LINE_COLOR),
+            (self.font_next, pygame.font.SysFont("DejaVu Sans", 34), NEXT_COLOR),
+        )
+
+        self.background = self._render_background()
+        # Faixa de notas entre o titulo e a letra.
+        lane_rect = pygame.Rect(40, 100, self.width - 80, self.height // 2 - 150)
+        self.lane = NoteLane(lane_rect) if lane_rect.height >= LANE_MIN_HEIGHT and lane_rect.width > 0 else None
+        self._text_cache: Dict[TextKey, pygame.Surface] = {}
+        self._slots: Dict[str, Tuple[pygame.Surface, pygame.Rect]] = {}
+        self._full_redraw = True
+        self.frame_ms = 0.0
+        self.last_frame_s = 0.0
+        self.frames = 0
+        self.last_present = 0.0
+        self.quit_requested = False
+        self.timings: Optional[StageTimes] = None
+        self.show_profile = False
+        self._profile_source: Optional[List[str]] = None
+        self._profile_surfaces: List[pygame.Surface] = []
+        self._profile_slots = 0
+        self._overlay_slots = 0
+
+    def prerender(self, title: str, artist: Optional[str], lines: List[str]) -> Dict[TextKey, pygame.Surface]:
+        # Roda fora da thread principal: so renderiza texto, nao toca na tela.
+        surfaces = {}
+        for font, copy, color in self._preload_fonts:
+            texts = [_title_text(title, artist)] if font is self.font_title else lines[:PRELOAD_LINES]
+            for text in texts:
+                surfaces[(id(font), text, color)] = copy.render(text, True, color)
+        return surfaces
+
+    def adopt(self, surfaces: Dict[TextKey, pygame.Surface]) -> None:
+        self._text_cache.clear()
+        self._text_cache.update(surfaces)
+        # Musica nova: nada da anterior (cantores de dueto, overlay) pode sobrar na tela.
+        self._slots.clear()
+        self._full_redraw = True
+
+    def set_song(self, melodies: List[Melody], channels: int) -> None:
+        if self.lane is not None:
+            self.lane.set_song(melodies, channels, SINGER_COLORS)
 
     def update(self, state: UIState) -> bool:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                self.quit_requested = True
                 return False
             if event.type == pygame.KEYDOWN and event.key in (pygame.K_ESCAPE, pygame.K_q):
+                self.quit_requested = True
+                return False
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_n:
+                # Pula so a musica atual; a fila continua.
                 return False
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                self.show_profile = not self.show_profile
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                self._full_redraw = True
+
+        started = time.perf_counter()
+        full = self._full_redraw
+        if full:
+            self.screen.blit(self.background, (0, 0))
+            self._slots.clear()
+            self._full_redraw = False
+        timings = self.timings
+        mark = timings.lap("fundo", started) if timings is not None and full else started
 
-        self._draw_background()
-        self._draw_header(state)
-        self._draw_lyrics(state)
-        self._draw_scores(state)
+        dirty: List[pygame.Rect] = []
+        self._draw_header(state, dirty)
+        self._draw_lyrics(state, dirty)
+        self._draw_scores(state, dirty)
+        self._draw_overlay(state, dirty)
+        self._draw_profile(state, dirty)
+        if timings is not None:
+            mark = timings.lap("texto", mark)
+        self._draw_lane(state, dirty)
+        if timings is not None:
+            mark = timings.lap("faixa", mark)
 
-        pygame.display.flip()
-        self.clock.tick(30)
+        if full:
+            pygame.display.flip()
+            self.last_present = time.perf_counter()
+        elif dirty:
+            pygame.display.update(dirty)
+            self.last_present = time.perf_counter()
+        if timings is not None:
+            mark = timings.lap("tela", mark)
+        self._count_frame(time.perf_counter() - started)
+        self.clock.tick(self.fps)
+        if timings is not None:
+            timings.lap("espera", mark)
         return True
 
-    def _draw_background(self) -> None:
-        self.screen.fill((10, 12, 18))
+    def _render_background(self) -> pygame.Surface:
+        surface = pygame.Surface((self.width, self.height)).convert()
+        surface.fill((10, 12, 18))
         top = pygame.Color(18, 30, 54)
         bottom = pygame.Color(6, 8, 14)
         for y in range(self.height):
@@ -61,36 +175,125 @@ class PygameUI:
             r = int(top.r * (1 - ratio) + bottom.r * ratio)
             g = int(top.g * (1 - ratio) + bottom.g * ratio)
             b = int(top.b * (1 - ratio) + bottom.b * ratio)
-            pygame.draw.line(self.screen, (r, g, b), (0, y), (self.width, y))
+            pygame.draw.line(surface, (r, g, b), (0, y), (self.width, y))
+        return surface
 
-    def _draw_header(self, state: UIState) -> None:
-        title = state.title
-        if state.artist:
-            title = f\"{state.title} - {state.artist}\"
-        text = self.font_title.render(title, True, (240, 240, 240))
-        self.screen.blit(text, (40, 24))
+    def _draw_header(self, state: UIState, dirty: List[pygame.Rect]) -> None:
+        text = self._text(self.font_title, _title_text(state.title, state.artist), TITLE_COLOR)
+        self._place("title", text, text.get_rect(topleft=(40, 24)), dirty)
 
-    def _draw_lyrics(self, state: UIState) -> None:
-        line = state.current_line or \"\"
-        next_line = state.next_line or \"\"
-        line_surf = self.font_line.render(line, True, (255, 236, 156))
-        next_surf = self.font_next.render(next_line, True, (190, 190, 190))
+    def _draw_lyrics(self, state: UIState, dirty: List[pygame.Rect]) -> None:
+        line = state.current_line or ""
+        next_line = state.next_line or ""
+        line_surf = self._text(self.font_line, line, LINE_COLOR)
+        next_surf = self._text(self.font_next, next_line, NEXT_COLOR)
 
         line_rect = line_surf.get_rect(center=(self.width // 2, self.height // 2))
         next_rect = next_surf.get_rect(center=(self.width // 2, self.height // 2 + 70))
 
-        self.screen.blit(line_surf, line_rect)
-        self.screen.blit(next_surf, next_rect)
+        self._place("line", line_surf, line_rect, dirty)
+        self._place("next", next_surf, next_rect, dirty)
 
-    def _draw_scores(self, state: UIState) -> None:
-        score_text = f\"Total: {state.score_total:05.1f}  |  Afinacao: {state.score_pitch:05.1f}  |  Ritmo: {state.score_rhythm:05.1f}\"
-        meta_text = f\"Notas: {state.notes_done}/{state.notes_total}\"
+    def _draw_scores(self, state: UIState, dirty: List[pygame.Rect]) -> None:
+        if len(state.singers) > 1:
+            self._draw_singers(state.singers, dirty)
+            return
+        score_text = f"Total: {state.score_total:05.1f}  |  Afinacao: {state.score_pitch:05.1f}  |  Ritmo: {state.score_rhythm:05.1f}"
+        meta_text = f"Notas: {state.notes_done}/{state.notes_total}"
 
-        score_surf = self.font_meta.render(score_text, True, (180, 220, 255))
-        meta_surf = self.font_meta.render(meta_text, True, (150, 150, 150))
+        score_surf = self._text(self.font_meta, score_text, (180, 220, 255))
+        meta_surf = self._text(self.font_meta, meta_text, (150, 150, 150))
 
-        self.screen.blit(score_surf, (40, self.height - 80))
-        self.screen.blit(meta_surf, (40, self.height - 45))
+        self._place("score", score_surf, score_surf.get_rect(topleft=(40, self.height - 80)), dirty)
+        self._place("meta", meta_surf, meta_surf.get_rect(topleft=(40, self.height - 45)), dirty)
+
+    def _draw_singers(self, singers: List[SingerScore], dirty: List[pygame.Rect]) -> None:
+        for index, singer in enumerate(singers):
+            text = f"{singer.name}: {singer.total:05.1f}  |  Notas: {singer.notes_done}/{singer.notes_total}"
+            surface = self._text(self.font_meta, text, SINGER_COLORS[index % len(SINGER_COLORS)])
+            y = self.height - 45 - 35 * (len(singers) - 1 - index)
+            self._place(f"singer{index}", surface, surface.get_rect(topleft=(40, y)), dirty)
+
+    def _draw_overlay(self, state: UIState, dirty: List[pygame.Rect]) -> None:
+        for index, line in enumerate(state.overlay):
+            surface = self._text(self.font_debug, line, (140, 255, 140))
+            rect = surface.get_rect(topright=(self.width - 20, 90 + 20 * index))
+            self._place(f"overlay{index}", surface, rect, dirty)
+        for index in range(len(state.overlay), self._overlay_slots):
+            self._erase(f"overlay{index}", dirty)
+        self._overlay_slots = len(state.overlay)
+
+    def _draw_profile(self, state: UIState, dirty: List[pygame.Rect]) -> None:
+        lines = state.profile if self.show_profile else []
+        if lines is not self._profile_source:
+            # Renderiza direto (sem o cache de texto): os numeros mudam a cada relatorio.
+            self._profile_source = lines
+            self._profile_surfaces = [self.font_debug.render(line, True, PROFILE_COLOR, PROFILE_BG) for line in lines]
+        for index, surface in enumerate(self._profile_surfaces):
+            self._place(f"profile{index}", surface, surface.get_rect(topleft=(50, 110 + 20 * index)), dirty)
+        for index in range(len(self._profile_surfaces), self._profile_slots):
+            self._erase(f"profile{index}", dirty)
+        self._profile_slots = len(self._profile_surfaces)
+
+    def _draw_lane(self, state: UIState, dirty: List[pygame.Rect]) -> None:
+        if self.lane is None or state.lane_time_s is None:
+            return
+        self.lane.draw(self.screen, state.lane_time_s, state.pitch_hz, dirty)
+        # Textos que caem sobre a faixa (overlay) voltam por cima dela; so a parte dentro da faixa,
+        # senao o resto do texto seria misturado de novo sobre si mesmo a cada quadro.
+        for surface, rect in self._slots.values():
+            inside = rect.clip(self.lane.rect)
+            if inside:
+                self.screen.blit(surface, inside, inside.move(-rect.x, -rect.y))
+
+    def _text(self, font: pygame.font.Font, text: str, color: Tuple[int, int, int]) -> pygame.Surface:
+        key = (id(font), text, color)
+        surface = self._text_cache.get(key)
+        if surface is None:
+            if len(self._text_cache) >= TEXT_CACHE_LIMIT:
+                self._text_cache.clear()
+            surface = font.render(text, True, color)
+            self._text_cache[key] = surface
+        return surface
+
+    def _place(self, slot: str, surface: pygame.Surface, rect: pygame.Rect, dirty: List[pygame.Rect]) -> None:
+        previous = self._slots.get(slot)
+        if previous is not None and previous[0] is surface and previous[1] == rect:
+            return
+
+        if previous is not None:
+            self._restore(slot, previous[1], dirty)
+
+        self.screen.blit(surface, rect)
+        dirty.append(rect)
+        self._slots[slot] = (surface, rect)
+
+    def _erase(self, slot: str, dirty: List[pygame.Rect]) -> None:
+        previous = self._slots.pop(slot, None)
+        if previous is not None:
+            self._restore(slot, previous[1], dirty)
+
+    def _restore(self, slot: str, old_rect: pygame.Rect, dirty: List[pygame.Rect]) -> None:
+        # Restaura o fundo onde o texto antigo estava e redesenha so a parte dos vizinhos que caiu ali;
+        # o resto deles continua na tela e, com alfa, ficaria mais escuro a cada nova mistura.
+        self.screen.blit(self.background, old_rect, old_rect)
+        dirty.append(old_rect)
+        for other, (other_surface, other_rect) in self._slots.items():
+            overlap = other_rect.clip(old_rect)
+            if other != slot and overlap:
+                self.screen.blit(other_surface, overlap, overlap.move(-other_rect.x, -other_rect.y))
+
+    def _count_frame(self, elapsed_s: float) -> None:
+        self.last_frame_s = elapsed_s
+        alpha = 0.05 if self.frames else 1.0
+        self.frame_ms = (1.0 - alpha) * self.frame_ms + alpha * elapsed_s * 1000.0
+        self.frames += 1
 
     def close(self) -> None:
         pygame.quit()
+
+
+def _title_text(title: str, artist: Optional[str]) -> str:
+    if artist:
+        return f"{title} - {artist}"
+    return title
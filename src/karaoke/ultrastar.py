@@ -15,6 +15,7 @@ class NoteToken:
     pitch: int
     text: str
     line_index: int
+    singer: int = 1
 
 
 def import_song(
@@ -26,9 +27,30 @@ def import_song(
     relative: bool = False,
     audio_mode: str = "symlink",
 ) -> None:
-    dest.mkdir(parents=True, exist_ok=True)
     txt_path = _find_txt(source, txt)
-    headers, tokens, line_bases = _parse_ultrastar(txt_path)
+    headers = convert_song(
+        txt_path.read_bytes(),
+        dest,
+        ticks_per_beat=ticks_per_beat,
+        include_freestyle=include_freestyle,
+        relative=relative,
+    )
+
+    audio_file = audio_filename(headers)
+    if audio_file and audio_mode != "none":
+        src_audio = (source / audio_file).resolve()
+        if src_audio.exists():
+            _handle_audio(src_audio, dest, audio_mode)
+
+
+def convert_song(
+    raw: bytes,
+    dest: Path,
+    ticks_per_beat: int = 4,
+    include_freestyle: bool = False,
+    relative: bool = False,
+) -> Dict[str, str]:
+    headers, tokens, line_bases = _parse_ultrastar_text(raw.decode("utf-8-sig", errors="ignore"))
 
     bpm = _parse_float(headers.get("BPM"))
     if bpm is None or bpm <= 0:
@@ -38,15 +60,21 @@ def import_song(
     gap_s = gap_ms / 1000.0
 
     use_relative = relative or headers.get("RELATIVE", "").upper() == "YES"
-    notes = _convert_notes(
-        tokens,
-        line_bases,
-        bpm=bpm,
-        ticks_per_beat=ticks_per_beat,
-        gap_s=gap_s,
-        include_freestyle=include_freestyle,
-        relative=use_relative,
-    )
+    # P3 em duetos marca trechos cantados pelos dois.
+    duet = any(token.singer == 2 for token in tokens)
+    singers = (1, 2) if duet else (1,)
+    melodies = [
+        _convert_notes(
+            [token for token in tokens if not duet or token.singer in (singer, 3)],
+            line_bases,
+            bpm=bpm,
+            ticks_per_beat=ticks_per_beat,
+            gap_s=gap_s,
+            include_freestyle=include_freestyle,
+            relative=use_relative,
+        )
+        for singer in singers
+    ]
 
     lyrics = _convert_lyrics(
         tokens,
@@ -57,15 +85,20 @@ def import_song(
         relative=use_relative,
     )
 
-    _write_melody_csv(dest / "melody.csv", notes)
+    dest.mkdir(parents=True, exist_ok=True)
+    _write_melody_csv(dest / "melody.csv", melodies[0])
+    duet_path = dest / "melody_p2.csv"
+    if duet:
+        _write_melody_csv(duet_path, melodies[1])
+    elif duet_path.exists():
+        duet_path.unlink()
     _write_lyrics_lrc(dest / "lyrics.lrc", lyrics)
-    _write_meta_json(dest / "meta.json", headers)
+    _write_meta_json(dest / "meta.json", headers, duet)
+    return headers
 
-    audio_file = headers.get("MP3") or headers.get("AUDIO")
-    if audio_file and audio_mode != "none":
-        src_audio = (source / audio_file).resolve()
-        if src_audio.exists():
-            _handle_audio(src_audio, dest, audio_mode)
+
+def audio_filename(headers: Dict[str, str]) -> Optional[str]:
+    return headers.get("MP3") or headers.get("AUDIO") or None
 
 
 def _find_txt(source: Path, explicit: Optional[str]) -> Path:
@@ -84,12 +117,17 @@ def _find_txt(source: Path, explicit: Optional[str]) -> Path:
 
 
 def _parse_ultrastar(path: Path) -> Tuple[Dict[str, str], List[NoteToken], Dict[int, int]]:
+    return _parse_ultrastar_text(path.read_text(encoding="utf-8-sig", errors="ignore"))
+
+
+def _parse_ultrastar_text(text: str) -> Tuple[Dict[str, str], List[NoteToken], Dict[int, int]]:
     headers: Dict[str, str] = {}
     tokens: List[NoteToken] = []
     line_bases: Dict[int, int] = {0: 0}
     line_index = 0
+    singer = 1
 
-    for raw in path.read_text(encoding="utf-8-sig", errors="ignore").splitlines():
+    for raw in text.splitlines():
         line = raw.strip()
         if not line:
             continue
@@ -107,7 +145,12 @@ def _parse_ultrastar(path: Path) -> Tuple[Dict[str, str], List[NoteToken], Dict[
             duration = int(parts[2])
             pitch = int(parts[3])
             text = parts[4] if len(parts) > 4 else ""
-            tokens.append(NoteToken(tag, start, duration, pitch, text, line_index))
+            tokens.append(NoteToken(tag, start, duration, pitch, text, line_index, singer))
+        elif tag == "P":
+            value = line[1:].strip()
+            if value.isdigit():
+                singer = int(value)
+                line_index += 1
         elif tag == "-":
             parts = line.split()
             if len(parts) > 1:
@@ -193,13 +236,18 @@ def _write_lyrics_lrc(path: Path, lines: List[Tuple[float, str]]) -> None:
     path.write_text("\n".join(output) + "\n", encoding="utf-8")
 
 
-def _write_meta_json(path: Path, headers: Dict[str, str]) -> None:
+def _write_meta_json(path: Path, headers: Dict[str, str], duet: bool = False) -> None:
     data = {
         "title": headers.get("TITLE") or "",
         "artist": headers.get("ARTIST") or "",
         "audio_offset_s": 0.0,
         "source": "ultrastar",
     }
+    if duet:
+        data["singers"] = [
+            headers.get(f"P{singer}") or headers.get(f"DUETSINGERP{singer}") or f"Cantor {singer}"
+            for singer in (1, 2)
+        ]
     path.write_text(json.dumps(data, ensure_ascii=True, indent=2) + "\n", encoding="utf-8")
 
 
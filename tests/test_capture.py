@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+from karaoke.analysis import LocalAnalysis  # noqa: E402
+from karaoke.config import AudioConfig, NoteTrackingConfig  # noqa: E402
+
+BLOCK = 256
+RATE = 8000
+RING_BLOCKS = 8
+
+
+class _Microphone:
+    # Entrega blocos ao callback como o PortAudio: ADC continuo, sem perdas.
+    def __init__(self, analysis: LocalAnalysis):
+        self.ring = analysis.ring
+        self.adc = 100.0
+        self.block = np.zeros((BLOCK, 1), dtype=np.float32)
+
+    def feed(self, blocks: int) -> None:
+        for _ in range(blocks):
+            time_info = SimpleNamespace(inputBufferAdcTime=self.adc, currentTime=self.adc)
+            self.ring.callback(self.block, BLOCK, time_info, None)
+            self.adc += BLOCK / RATE
+
+
+def _analysis() -> LocalAnalysis:
+    config = AudioConfig(sample_rate=RATE, block_size=BLOCK, channels=1, ring_blocks=RING_BLOCKS)
+    return LocalAnalysis(config, NoteTrackingConfig())
+
+
+def _play(analysis: LocalAnalysis, mic: _Microphone, blocks: int) -> None:
+    analysis.begin(time.perf_counter())
+    for _ in range(blocks):
+        mic.feed(1)
+        analysis.poll()
+
+
+def test_idle_before_first_song_is_not_a_capture_loss():
+    analysis = _analysis()
+    mic = _Microphone(analysis)
+    # Musica sendo preparada: o stream ja esta aberto e ninguem le o ring.
+    mic.feed(RING_BLOCKS * 10)
+    assert len(analysis.ring) == 0
+
+    _play(analysis, mic, 20)
+    ring = analysis.ring
+    assert (ring.overruns, ring.dropped_frames) == (0, 0)
+    # Sem lacuna falsa no primeiro bloco: o relogio andou so o que foi lido.
+    assert analysis.song_time == pytest.approx(20 * BLOCK / RATE)
+
+
+def test_idle_between_songs_is_not_a_capture_loss():
+    analysis = _analysis()
+    mic = _Microphone(analysis)
+    _play(analysis, mic, 5)
+    analysis.flush()
+    mic.feed(RING_BLOCKS * 10)
+
+    _play(analysis, mic, 3)
+    ring = analysis.ring
+    assert (ring.overruns, ring.dropped_frames) == (0, 0)
+    assert analysis.song_time == pytest.approx(3 * BLOCK / RATE)
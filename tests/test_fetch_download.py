@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import os
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "tools"))
+
+import fetch_performous as fetch  # noqa: E402
+
+PAYLOAD = os.urandom(300_000)
+CUT = 70_000
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Estado por servidor: server.ranges guarda o cabecalho Range de cada pedido.
+    def do_GET(self):
+        server = self.server
+        header = self.headers.get("Range")
+        server.ranges.append(header)
+        match = re.fullmatch(r"bytes=(\d+)-", header or "")
+        if match and server.honor_range:
+            start = int(match.group(1))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(PAYLOAD) - 1}/{len(PAYLOAD)}")
+        else:
+            start = 0
+            self.send_response(200)
+        body = PAYLOAD[start:]
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if len(server.ranges) == 1:
+            # Primeira transferencia cai no meio: anuncia tudo e fecha a conexao depois de CUT bytes.
+            self.wfile.write(body[:CUT])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve(honor_range: bool) -> Iterator[ThreadingHTTPServer]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.ranges: List[Optional[str]] = []
+    server.honor_range = honor_range
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def range_server():
+    yield from _serve(honor_range=True)
+
+
+@pytest.fixture
+def plain_server():
+    yield from _serve(honor_range=False)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(fetch.time, "sleep", lambda seconds: None)
+
+
+def _url(server: ThreadingHTTPServer) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}/pacote.zip"
+
+
+def test_interrupted_download_resumes_with_range(range_server, tmp_path):
+    path = tmp_path / "pacote.zip.part"
+    fetch._download(_url(range_server), path)
+    assert range_server.ranges == [None, f"bytes={CUT}-"]
+    assert path.read_bytes() == PAYLOAD
+
+
+def test_server_without_range_restarts_from_scratch(plain_server, tmp_path):
+    path = tmp_path / "pacote.zip.part"
+    fetch._download(_url(plain_server), path)
+    # Pediu a continuacao, mas o 200 traz o arquivo inteiro: nada pode ser anexado ao .part.
+    assert plain_server.ranges == [None, f"bytes={CUT}-"]
+    assert path.read_bytes() == PAYLOAD
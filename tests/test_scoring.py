@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import random
+import sys
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+from karaoke.config import ScoringConfig  # noqa: E402
+from karaoke.melody import Melody, ReferenceNote  # noqa: E402
+from karaoke.scoring import IncrementalScorer, score_melody, score_notes  # noqa: E402
+from karaoke.tracking import UserNote  # noqa: E402
+
+TRIALS = 3000
+
+
+def _random_references(rng: random.Random) -> List[ReferenceNote]:
+    notes = []
+    time_s = rng.uniform(0.0, 1.0)
+    for _ in range(rng.randint(0, 30)):
+        duration = rng.uniform(0.05, 1.0)
+        notes.append(ReferenceNote(time_s, duration, rng.randint(48, 72)))
+        # Passo negativo de vez em quando: referencias podem se sobrepor.
+        time_s += rng.uniform(-0.2, 1.2) if rng.random() < 0.2 else duration + rng.uniform(0.0, 0.5)
+    notes.sort(key=lambda note: note.start_s)
+    return notes
+
+
+def _random_users(rng: random.Random, references: List[ReferenceNote]) -> List[UserNote]:
+    users = []
+    for ref in references:
+        if rng.random() < 0.3:
+            continue
+        start = ref.start_s + rng.gauss(0.0, 0.15)
+        users.append(UserNote(start, start + ref.duration_s * rng.uniform(0.3, 1.5), ref.midi + rng.gauss(0.0, 0.6)))
+    for _ in range(rng.randint(0, 5)):
+        # Notas soltas, longe ou no meio das referencias.
+        start = rng.uniform(0.0, 40.0)
+        users.append(UserNote(start, start + rng.uniform(0.05, 0.8), rng.uniform(45.0, 75.0)))
+    users.sort(key=lambda note: note.start_s)
+    return users
+
+
+def _chunks(rng: random.Random, users: List[UserNote]) -> List[List[UserNote]]:
+    chunks = []
+    index = 0
+    while index < len(users):
+        size = rng.randint(0, 4)
+        chunks.append(users[index : index + size])
+        index += size
+    return chunks
+
+
+def test_incremental_matches_batch_scoring():
+    rng = random.Random(1234)
+    config = ScoringConfig()
+    for trial in range(TRIALS):
+        references = _random_references(rng)
+        users = _random_users(rng, references)
+        scorer = IncrementalScorer.from_notes(references, config)
+        seen: List[UserNote] = []
+        for chunk in _chunks(rng, users):
+            scorer.add(chunk)
+            seen.extend(chunk)
+            assert scorer.result() == score_notes(references, seen, config), f"trial {trial}, {len(seen)} notas"
+        assert scorer.result() == score_notes(references, users, config), f"trial {trial}"
+
+
+def test_empty_inputs():
+    config = ScoringConfig()
+    references = [ReferenceNote(1.0, 0.5, 60.0)]
+    scorer = IncrementalScorer.from_notes(references, config)
+    scorer.add([])
+    assert scorer.result() == score_notes(references, [], config)
+    assert IncrementalScorer.from_notes([], config).result() == score_notes([], [], config)
+
+
+def test_out_of_order_notes_are_rejected():
+    scorer = IncrementalScorer.from_notes([ReferenceNote(1.0, 0.5, 60.0)], ScoringConfig())
+    scorer.add([UserNote(2.0, 2.5, 60.0)])
+    with pytest.raises(ValueError):
+        scorer.add([UserNote(1.0, 1.5, 60.0)])
+
+
+def test_melody_scorer_uses_arrays_only():
+    rng = random.Random(99)
+    references = _random_references(rng)
+    while not references:
+        references = _random_references(rng)
+    users = _random_users(rng, references)
+    rows = [(note.start_s, note.duration_s, note.end_s, note.midi) for note in references]
+    columns = [np.array(values, dtype=np.float64) for values in zip(*rows)]
+    # Como uma melodia vinda do .song.cache: so arrays, notas criadas sob demanda.
+    melody = Melody.from_arrays(*columns)
+    scorer = IncrementalScorer.from_melody(melody, ScoringConfig())
+    scorer.add(users)
+    assert scorer.result() == score_melody(melody, users, ScoringConfig())
+    assert melody._notes is None
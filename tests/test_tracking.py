@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+from karaoke.config import NoteTrackingConfig  # noqa: E402
+from karaoke.tracking import NoteTracker  # noqa: E402
+
+
+def _floor_after(hop: int, sample_rate: int, seconds: float) -> float:
+    tracker = NoteTracker(NoteTrackingConfig())
+    tracker.process_rms(0.0, 0.1, None)
+    steps = int(seconds * sample_rate / hop)
+    for index in range(1, steps + 1):
+        tracker.process_rms(index * hop / sample_rate, 0.01, None)
+    # Ultima janela exatamente no fim: todos os casos cobrem o mesmo tempo.
+    tracker.process_rms(seconds, 0.01, None)
+    return tracker.noise_floor
+
+
+def test_noise_floor_does_not_depend_on_hop():
+    # Mesmo tempo decorrido, mesmo piso: com hop menor so ha mais passos, cada um menor.
+    reference = _floor_after(1024, 44100, 2.0)
+    for hop, sample_rate in ((256, 44100), (512, 48000), (2048, 22050)):
+        assert _floor_after(hop, sample_rate, 2.0) == pytest.approx(reference, rel=1e-6)
+    assert 0.01 < reference < 0.1
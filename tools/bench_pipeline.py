@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+from karaoke.analysis import LocalAnalysis  # noqa: E402
+from karaoke.config import AudioConfig, NoteTrackingConfig, ScoringConfig  # noqa: E402
+from karaoke.dsp import midi_to_hz  # noqa: E402
+from karaoke.lyrics import Lyrics  # noqa: E402
+from karaoke.melody import Melody, ReferenceNote  # noqa: E402
+from karaoke.pitch import PITCH_BACKENDS  # noqa: E402
+from karaoke.profiling import StageTimes  # noqa: E402
+from karaoke.scoring import IncrementalScorer, score_notes  # noqa: E402
+from karaoke.tracking import UserNote  # noqa: E402
+
+UI_FPS = 30
+MIN_REGRESSION_US = 1.0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline com cantor sintetico.")
+    parser.add_argument("--song", default=str(ROOT / "songs" / "demo"), help="Pasta com melody.csv e lyrics.lrc")
+    parser.add_argument("--loops", type=int, default=1, help="Repete a melodia N vezes (simula musicas longas)")
+    parser.add_argument("--samplerate", type=int, default=44100, help="Sample rate")
+    parser.add_argument("--blocksize", type=int, default=1024, help="Tamanho do bloco de audio")
+    parser.add_argument("--window", type=int, default=0, help="Janela de analise em amostras (0 = blocksize)")
+    parser.add_argument("--hop", type=int, default=0, help="Passo entre janelas em amostras (0 = janela)")
+    parser.add_argument(
+        "--pitch-backend",
+        choices=sorted(PITCH_BACKENDS),
+        default=AudioConfig.pitch_backend,
+        help="Algoritmo de deteccao de pitch",
+    )
+    parser.add_argument("--ui-size", default="1280x720", help="Resolucao da UI no driver dummy")
+    parser.add_argument("--no-ui", action="store_true", help="Nao mede a UI")
+    parser.add_argument("--seed", type=int, default=7, help="Semente do cantor sintetico")
+    parser.add_argument("--save", help="Salva o resultado como baseline JSON")
+    parser.add_argument("--baseline", help="Compara com um baseline JSON salvo antes")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Piora relativa aceita antes de acusar regressao")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    song_dir = Path(args.song)
+    melody = Melody(_tile_notes(Melody.from_csv(song_dir / "melody.csv").notes, args.loops))
+    lyrics_path = song_dir / "lyrics.lrc"
+    lyrics = Lyrics.from_lrc(lyrics_path) if lyrics_path.exists() else Lyrics([])
+
+    audio_cfg = AudioConfig(
+        sample_rate=args.samplerate,
+        block_size=args.blocksize,
+        window_size=args.window,
+        hop_size=args.hop,
+        pitch_backend=args.pitch_backend,
+    )
+    signal = synth_singer(melody.notes, audio_cfg.sample_rate, np.random.default_rng(args.seed))
+    count = len(signal) // audio_cfg.block_size
+    blocks = signal[: count * audio_cfg.block_size].reshape(count, audio_cfg.block_size)
+    block_s = audio_cfg.block_size / audio_cfg.sample_rate
+    times = np.arange(count) * block_s
+
+    ui = None
+    if not args.no_ui:
+        ui = _make_ui(args.ui_size)
+
+    stages = run_stages(blocks, times, melody, lyrics, audio_cfg, ui)
+    if ui:
+        ui.close()
+
+    report = {
+        "meta": {
+            "song": str(song_dir),
+            "loops": args.loops,
+            "blocks": count,
+            "audio_s": count * block_s,
+            "block_size": audio_cfg.block_size,
+            "window_size": audio_cfg.window_size or audio_cfg.block_size,
+            "hop_size": audio_cfg.hop_size or audio_cfg.window_size or audio_cfg.block_size,
+            "sample_rate": audio_cfg.sample_rate,
+            "pitch_backend": audio_cfg.pitch_backend,
+            "notes": len(melody.notes),
+            "machine": platform.machine(),
+            "python": platform.python_version(),
+        },
+        "stages": stages,
+    }
+    _print_report(report)
+
+    status = 0
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(baseline, report, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSAO: {line}")
+        if regressions:
+            status = 1
+        else:
+            print(f"Sem regressoes em relacao a {args.baseline}.")
+
+    if args.save:
+        Path(args.save).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline salvo em {args.save}")
+    return status
+
+
+def synth_singer(notes: List[ReferenceNote], sample_rate: int, rng: np.random.Generator) -> np.ndarray:
+    end_s = max((note.end_s for note in notes), default=0.0) + 1.0
+    signal = np.zeros(int(end_s * sample_rate), dtype=np.float64)
+
+    for note in notes:
+        if rng.random() < 0.08:
+            continue
+        start_s = max(note.start_s + rng.normal(0.0, 0.04), 0.0)
+        duration_s = max(note.duration_s * rng.uniform(0.8, 1.05), 0.05)
+        start = int(start_s * sample_rate)
+        length = min(int(duration_s * sample_rate), len(signal) - start)
+        if length <= 0:
+            continue
+
+        t = np.arange(length) / sample_rate
+        detune = rng.normal(0.0, 0.15)
+        vibrato = 0.3 * np.sin(2.0 * np.pi * rng.uniform(4.5, 6.5) * t) * np.clip(t / 0.3, 0.0, 1.0)
+        freq = midi_to_hz(note.midi + detune) * 2.0 ** (vibrato / 12.0)
+        phase = 2.0 * np.pi * np.cumsum(freq) / sample_rate
+
+        voice = np.zeros(length)
+        for harmonic in range(1, 6):
+            voice += np.sin(harmonic * phase) / harmonic
+        envelope = np.minimum(1.0, np.minimum(t / 0.03, (length / sample_rate - t) / 0.05))
+        signal[start : start + length] += 0.25 * voice * envelope
+
+    signal += 0.004 * rng.standard_normal(len(signal))
+    return signal.astype(np.float32)
+
+
+def run_stages(
+    blocks: np.ndarray,
+    times: np.ndarray,
+    melody: Melody,
+    lyrics: Lyrics,
+    audio_cfg: AudioConfig,
+    ui,
+) -> Dict[str, Dict[str, float]]:
+    count = len(blocks)
+    block_s = audio_cfg.block_size / audio_cfg.sample_rate
+    scoring_cfg = ScoringConfig()
+    results: Dict[str, Dict[str, float]] = {}
+
+    # O mesmo laco do jogo: ring -> janelas -> FrameFeatures -> pitch em lote -> process_rms,
+    # com os tempos de cada parte vindos dos timers do --profile.
+    timings = StageTimes()
+    analysis = LocalAnalysis(audio_cfg, NoteTrackingConfig(), timings=timings)
+    # Como no jogo, o ring so aceita blocos depois do begin() da musica.
+    analysis.begin(time.perf_counter())
+    per_block: List[List[UserNote]] = []
+    pitches: List[Optional[float]] = []
+    elapsed = 0.0
+    for block in blocks:
+        analysis.ring.callback(block[:, None], len(block), None, None)
+        started = time.perf_counter()
+        per_block.append(analysis.poll()[0])
+        elapsed += time.perf_counter() - started
+        pitches.append(analysis.pitches[0].hz)
+    started = time.perf_counter()
+    per_block[-1] = per_block[-1] + analysis.flush()[0]
+    elapsed += time.perf_counter() - started
+    results["analysis"] = _stage(elapsed, count, block_s)
+    for stage, name in (("janelas", "frames"), ("pitch", "pitch"), ("notas", "tracking")):
+        results[name] = _stage(timings.total_s.get(stage, 0.0), count, block_s)
+
+    def _score_incremental() -> None:
+        scorer = IncrementalScorer.from_melody(melody, scoring_cfg)
+        for notes in per_block:
+            scorer.add(notes)
+            scorer.result()
+
+    results["scoring"] = _stage(_timed(_score_incremental), count, block_s)
+
+    def _score_full() -> None:
+        users: List[UserNote] = []
+        for notes in per_block:
+            if notes:
+                users.extend(notes)
+                score_notes(melody.notes, users, scoring_cfg)
+
+    results["score_notes"] = _stage(_timed(_score_full), count, block_s)
+
+    frame_times = np.arange(0.0, count * block_s, 1.0 / UI_FPS)
+    frames = len(frame_times)
+    elapsed = _timed(lambda: [lyrics.current_and_next(float(t)) for t in frame_times])
+    results["lyrics"] = _stage(elapsed, count, block_s, frames)
+
+    if ui is not None:
+        state = _ui_state(melody)
+        ui.set_song([melody], 1)
+
+        def _draw() -> None:
+            for time_s in frame_times:
+                _set_lyrics(state, lyrics, float(time_s))
+                state.lane_time_s = float(time_s)
+                state.pitch_hz = [pitches[min(int(time_s / block_s), count - 1)]]
+                ui.update(state)
+
+        results["ui"] = _stage(_timed(_draw), count, block_s, frames)
+        results["ui"]["frame_ms"] = ui.frame_ms
+
+    results["end_to_end"] = _stage(_timed(lambda: _end_to_end(blocks, times, melody, lyrics, audio_cfg, ui)), count, block_s)
+    return results
+
+
+def _end_to_end(
+    blocks: np.ndarray,
+    times: np.ndarray,
+    melody: Melody,
+    lyrics: Lyrics,
+    audio_cfg: AudioConfig,
+    ui,
+) -> None:
+    analysis = LocalAnalysis(audio_cfg, NoteTrackingConfig())
+    analysis.begin(time.perf_counter())
+    scorer = IncrementalScorer.from_melody(melody, ScoringConfig())
+    next_frame = 0.0
+    state = _ui_state(melody)
+    if ui is not None:
+        ui.set_song([melody], 1)
+    for time_s, block in zip(times, blocks):
+        analysis.ring.callback(block[:, None], len(block), None, None)
+        scorer.add(analysis.poll()[0])
+        if time_s >= next_frame:
+            next_frame += 1.0 / UI_FPS
+            _set_lyrics(state, lyrics, float(time_s))
+            breakdown = scorer.result()
+            if ui is not None:
+                state.score_total = breakdown.total
+                state.notes_done = breakdown.matched
+                state.lane_time_s = analysis.song_time
+                state.pitch_hz = [estimate.hz for estimate in analysis.pitches]
+                ui.update(state)
+    scorer.add(analysis.flush()[0])
+    scorer.result()
+
+
+def compare(baseline: dict, report: dict, tolerance: float) -> List[str]:
+    regressions: List[str] = []
+    for name, current in report["stages"].items():
+        previous = baseline.get("stages", {}).get(name)
+        if not previous or previous["us_per_block"] <= 0.0:
+            continue
+        ratio = current["us_per_block"] / previous["us_per_block"]
+        grew_us = current["us_per_block"] - previous["us_per_block"]
+        if ratio > 1.0 + tolerance and grew_us > MIN_REGRESSION_US:
+            regressions.append(
+                f"{name}: {previous['us_per_block']:.1f} -> {current['us_per_block']:.1f} us/bloco ({(ratio - 1.0) * 100.0:+.0f}%)"
+            )
+    return regressions
+
+
+def _stage(elapsed_s: float, blocks: int, block_s: float, calls: Optional[int] = None) -> Dict[str, float]:
+    audio_s = blocks * block_s
+    result = {
+        "us_per_block": elapsed_s * 1e6 / max(blocks, 1),
+        "realtime_factor": audio_s / elapsed_s if elapsed_s > 0.0 else 0.0,
+        "elapsed_s": elapsed_s,
+    }
+    if calls is not None:
+        result["us_per_call"] = elapsed_s * 1e6 / max(calls, 1)
+    return result
+
+
+def _timed(func: Callable[[], object]) -> float:
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+def _tile_notes(notes: List[ReferenceNote], loops: int) -> List[ReferenceNote]:
+    if loops <= 1 or not notes:
+        return list(notes)
+    span = max(note.end_s for note in notes) + 1.0
+    return [
+        ReferenceNote(note.start_s + loop * span, note.duration_s, note.midi)
+        for loop in range(loops)
+        for note in notes
+    ]
+
+
+def _make_ui(size: str):
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    from karaoke.ui import PygameUI
+
+    width, _, height = size.partition("x")
+    return PygameUI(size=(int(width), int(height)), fps=0)
+
+
+def _ui_state(melody: Melody):
+    from karaoke.ui import UIState
+
+    return UIState(
+        title="Benchmark",
+        artist="Cantor sintetico",
+        current_line="",
+        next_line="",
+        score_total=0.0,
+        score_pitch=0.0,
+        score_rhythm=0.0,
+        notes_done=0,
+        notes_total=len(melody.notes),
+    )
+
+
+def _set_lyrics(state, lyrics: Lyrics, time_s: float) -> None:
+    current, next_line = lyrics.current_and_next(time_s)
+    state.current_line = current.text if current else ""
+    state.next_line = next_line.text if next_line else ""
+
+
+def _print_report(report: dict) -> None:
+    meta = report["meta"]
+    print(
+        f"Musica: {meta['song']} ({meta['notes']} notas, {meta['audio_s']:.1f}s, "
+        f"{meta['blocks']} blocos de {meta['block_size']}, janela {meta['window_size']}/hop {meta['hop_size']}, "
+        f"pitch={meta['pitch_backend']})"
+    )
+    print(f"{'Etapa':<12} {'us/bloco':>10} {'x tempo real':>14}")
+    for name, stage in report["stages"].items():
+        print(f"{name:<12} {stage['us_per_block']:>10.1f} {stage['realtime_factor']:>14.1f}")
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+from karaoke.config import AudioConfig  # noqa: E402
+from karaoke.pitch import PITCH_BACKENDS, create_pitch_estimator  # noqa: E402
+
+SILENCE_PEAK = 1e-4
+# Somas diretas e FFT diferem no arredondamento; casos no limite podem virar para o outro lado.
+MIN_AGREEMENT = 0.99
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Mede custo e acerto dos backends de pitch (loop vs batch).")
+    parser.add_argument("--frames", type=int, default=2000, help="Quantidade de blocos sinteticos")
+    parser.add_argument("--samplerate", type=int, default=44100, help="Sample rate")
+    parser.add_argument("--blocksize", type=int, default=1024, help="Tamanho do bloco de audio")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticoes (vale a melhor)")
+    parser.add_argument("--backend", action="append", choices=sorted(PITCH_BACKENDS), help="Backend a medir (padrao: todos)")
+    parser.add_argument(
+        "--check-frames",
+        type=int,
+        default=300,
+        help="Blocos comparados com a referencia quadro a quadro (lenta, sem FFT)",
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    cfg = AudioConfig(sample_rate=args.samplerate, block_size=args.blocksize)
+    frames, freqs = synth_frames(args.frames, cfg.block_size, cfg.sample_rate)
+    budget_us = cfg.block_size / cfg.sample_rate * 1e6
+
+    print(f"Blocos: {args.frames} x {cfg.block_size} (orcamento {budget_us:.0f} us/bloco)")
+    all_same = True
+    for name in args.backend or sorted(PITCH_BACKENDS):
+        estimator = create_pitch_estimator(cfg, name)
+        loop_s = _best_of(args.repeat, lambda: [estimator.estimate(frame) for frame in frames])
+        estimator.reset_cost()
+        batch_s = _best_of(args.repeat, lambda: estimator.estimate_batch(frames))
+        batch_cost_us = estimator.cost_us_per_block
+
+        batch_hz, _ = estimator.estimate_batch(frames)
+        # Compara com uma implementacao independente (um quadro por vez, somas diretas), nao com
+        # estimate(), que e so um lote de um.
+        checked = frames[: args.check_frames]
+        reference = REFERENCES[name]
+        reference_hz = np.array([reference(frame, cfg) for frame in checked])
+        agreement = _agreement(reference_hz, batch_hz[: len(checked)])
+        same = agreement >= MIN_AGREEMENT
+        all_same = all_same and same
+
+        voiced = freqs > 0
+        cents = np.abs(1200.0 * np.log2(batch_hz[voiced] / freqs[voiced]))
+        hits = float(np.mean(cents <= 50.0)) * 100.0
+
+        print(f"[{name}]")
+        print(f"  estimate (loop):  {args.frames / loop_s:10.0f} blocos/s  ({loop_s / args.frames * 1e6:.0f} us/bloco)")
+        print(f"  estimate_batch:   {args.frames / batch_s:10.0f} blocos/s  ({batch_cost_us:.0f} us/bloco)")
+        print(f"  Ganho:            {loop_s / batch_s:10.1f}x")
+        print(f"  Acertos (50c):    {hits:10.1f}%")
+        print(f"  Igual a referencia: {agreement * 100.0:9.1f}% de {len(checked)} blocos ({'sim' if same else 'NAO'})")
+    return 0 if all_same else 1
+
+
+def reference_autocorr(frame: np.ndarray, cfg: AudioConfig) -> float:
+    # Estimador original (um bloco por vez), antes do lote.
+    x = frame.astype(np.float32)
+    x = x - np.mean(x)
+    if np.max(np.abs(x)) < SILENCE_PEAK:
+        return np.nan
+    x = x * np.hanning(len(x))
+    corr = np.fft.irfft(np.abs(np.fft.rfft(x)) ** 2)
+    corr = corr[: len(corr) // 2]
+    if corr[0] <= 1e-9:
+        return np.nan
+    corr = corr / corr[0]
+    min_lag, max_lag = _lag_range(cfg, len(corr) - 1)
+    if max_lag <= min_lag + 2:
+        return np.nan
+    lag = int(np.argmax(corr[min_lag:max_lag])) + min_lag
+    if corr[lag] < cfg.corr_threshold:
+        return np.nan
+    if 1 <= lag < len(corr) - 1:
+        y0, y1, y2 = corr[lag - 1], corr[lag], corr[lag + 1]
+        denom = 2.0 * (2.0 * y1 - y0 - y2)
+        if abs(denom) > 1e-6:
+            lag = lag + (y0 - y2) / denom
+    return cfg.sample_rate / lag if lag > 0 else np.nan
+
+
+def reference_yin(frame: np.ndarray, cfg: AudioConfig) -> float:
+    x = _centered(frame)
+    if x is None:
+        return np.nan
+    min_lag, max_lag = _lag_range(cfg, len(x) // 2)
+    span = len(x) - max_lag - 1
+    diff = np.array([np.sum((x[:span] - x[tau : tau + span]) ** 2) for tau in range(max_lag + 2)])
+    cmnd = np.ones_like(diff)
+    running = 0.0
+    for tau in range(1, len(diff)):
+        running += diff[tau]
+        if running > 1e-12:
+            cmnd[tau] = diff[tau] * tau / running
+    for tau in range(min_lag, max_lag + 1):
+        if cmnd[tau] < cfg.yin_threshold:
+            # Desce ate o minimo local depois do primeiro ponto abaixo do limiar.
+            while tau < max_lag and cmnd[tau + 1] < cmnd[tau]:
+                tau += 1
+            return cfg.sample_rate / (tau + _vertex(cmnd, tau))
+    return np.nan
+
+
+def reference_mpm(frame: np.ndarray, cfg: AudioConfig) -> float:
+    x = _centered(frame)
+    if x is None:
+        return np.nan
+    size = len(x)
+    min_lag, max_lag = _lag_range(cfg, size // 2)
+    nsdf = np.zeros(max_lag + 2)
+    for tau in range(max_lag + 2):
+        head, tail = x[: size - tau], x[tau:]
+        norm = np.dot(head, head) + np.dot(tail, tail)
+        if norm > 1e-12:
+            nsdf[tau] = 2.0 * np.dot(head, tail) / norm
+    peaks = [
+        tau
+        for tau in range(min_lag, max_lag + 1)
+        if nsdf[tau] > 0.0 and nsdf[tau] >= nsdf[tau - 1] and nsdf[tau] > nsdf[tau + 1]
+    ]
+    if not peaks:
+        return np.nan
+    highest = max(nsdf[tau] for tau in peaks)
+    lag = next(tau for tau in peaks if nsdf[tau] >= cfg.mpm_cutoff * highest)
+    if nsdf[lag] < cfg.corr_threshold:
+        return np.nan
+    return cfg.sample_rate / (lag + _vertex(nsdf, lag))
+
+
+REFERENCES: Dict[str, Callable[[np.ndarray, AudioConfig], float]] = {
+    "autocorr": reference_autocorr,
+    "yin": reference_yin,
+    "mpm": reference_mpm,
+}
+
+
+def synth_frames(count: int, block_size: int, sample_rate: int) -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(1234)
+    t = np.arange(block_size) / sample_rate
+    freqs = rng.uniform(100.0, 800.0, size=(count, 1))
+    amps = rng.choice([0.0, 0.2, 0.5], size=(count, 1))
+    frames = np.zeros((count, block_size))
+    for harmonic in range(1, 4):
+        frames += (amps / harmonic) * np.sin(2.0 * np.pi * freqs * harmonic * t + harmonic)
+    frames += 0.01 * rng.standard_normal((count, block_size))
+    freqs = np.where(amps > 0.0, freqs, 0.0)[:, 0]
+    return frames.astype(np.float32), freqs
+
+
+def _agreement(reference_hz: np.ndarray, batch_hz: np.ndarray) -> float:
+    # Mesmo veredito de voz e, com voz, menos de 1 cent de diferenca.
+    both_silent = np.isnan(reference_hz) & np.isnan(batch_hz)
+    with np.errstate(invalid="ignore"):
+        close = np.abs(1200.0 * np.log2(batch_hz / reference_hz)) < 1.0
+    return float(np.mean(both_silent | close)) if len(reference_hz) else 1.0
+
+
+def _centered(frame: np.ndarray):
+    x = frame.astype(np.float32)
+    x = x - np.mean(x)
+    if np.max(np.abs(x)) < SILENCE_PEAK:
+        return None
+    return x.astype(np.float64)
+
+
+def _lag_range(cfg: AudioConfig, max_available: int) -> Tuple[int, int]:
+    return int(cfg.sample_rate / cfg.max_freq), min(int(cfg.sample_rate / cfg.min_freq), max_available)
+
+
+def _vertex(values: np.ndarray, lag: int) -> float:
+    if not 1 <= lag < len(values) - 1:
+        return 0.0
+    y0, y1, y2 = values[lag - 1], values[lag], values[lag + 1]
+    denom = y0 - 2.0 * y1 + y2
+    if abs(denom) <= 1e-12:
+        return 0.0
+    return float(np.clip(0.5 * (y0 - y2) / denom, -0.5, 0.5))
+
+
+def _best_of(repeat: int, func) -> float:
+    best = float("inf")
+    for _ in range(max(repeat, 1)):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -2,22 +2,57 @@
 from __future__ import annotations
 
 import argparse
+import hashlib
 import json
+import os
 import re
+import shutil
 import sys
+import time
+import urllib.error
 import urllib.request
 import zipfile
-from pathlib import Path
-from typing import Dict, Iterable, List, Optional
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(ROOT / "src"))
 
-from karaoke.ultrastar import import_song  # noqa: E402
+from karaoke.ultrastar import audio_filename, convert_song, import_song  # noqa: E402
 
 
 PERFORMOUS_SONGS_URL = "https://performous.org/songs"
-SOURCEFORGE_RE = re.compile(r"https?://sourceforge\\.net/projects/performous/files/[^\\s\"']+?\\.zip/download")
+MANIFEST_NAME = ".import-manifest.json"
+
+COPY_CHUNK = 1 << 20
+DOWNLOAD_CHUNK = 1 << 16
+DOWNLOAD_RETRIES = 4
+SOURCEFORGE_RE = re.compile(r"https?://sourceforge\.net/projects/performous/files/[^\s\"']+?\.zip/download")
+
+
+@dataclass
+class ImportOptions:
+    ticks_per_beat: int
+    include_freestyle: bool
+    relative: bool
+    audio_mode: str
+
+
+@dataclass
+class ImportTask:
+    target: Path
+    options: ImportOptions
+    digest: str = ""
+    error: Optional[str] = None
+    source_dir: Optional[Path] = None
+    zip_path: Optional[Path] = None
+    txt_member: Optional[str] = None
+    files: Dict[str, str] = field(default_factory=dict)
+
+
+_ARCHIVES: Dict[Path, zipfile.ZipFile] = {}
 
 
 def parse_args() -> argparse.Namespace:
@@ -34,6 +69,11 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--max-songs", type=int, default=0, help="Limita quantidade de musicas importadas (0 = sem limite)")
     parser.add_argument("--refresh", action="store_true", help="Rebaixa e reextrai os pacotes")
     parser.add_argument("--json", action="store_true", help="Saida em JSON ao listar")
+    parser.add_argument("--jobs", type=int, default=0, help="Processos de importacao em paralelo (0 = numero de CPUs)")
+    parser.add_argument("--force", action="store_true", help="Reimporta mesmo musicas sem mudanca")
+    parser.add_argument("--connections", type=int, default=3, help="Downloads simultaneos")
+    parser.add_argument("--verify", action="store_true", help="Confere o CRC de todo o zip apos o download")
+    parser.add_argument("--extract", action="store_true", help="Extrai o zip no cache antes de importar (permite symlink do audio)")
     return parser.parse_args()
 
 
@@ -58,41 +98,201 @@ def main() -> int:
     cache_root = Path(args.cache)
     cache_root.mkdir(parents=True, exist_ok=True)
 
-    imported = 0
-    for pkg in selected:
-        zip_path = download_package(pkg, cache_root, refresh=args.refresh)
-        extract_dir = extract_package(zip_path, cache_root, refresh=args.refresh)
-        song_dirs = find_song_dirs(extract_dir)
-
-        if not song_dirs:
-            print(f"Nenhuma musica encontrada em {extract_dir}")
+    started = time.perf_counter()
+    options = ImportOptions(
+        ticks_per_beat=args.ticks_per_beat,
+        include_freestyle=args.include_freestyle,
+        relative=args.relative,
+        audio_mode=args.audio_mode,
+    )
+    manifest_path = dest_root / MANIFEST_NAME
+    manifest = {} if args.force else load_manifest(manifest_path)
+
+    tasks: List[ImportTask] = []
+    skipped = 0
+    failed = 0
+    downloads = download_packages(selected, cache_root, args.refresh, args.verify, args.connections)
+    for pkg, zip_path in downloads:
+        if zip_path is None:
+            failed += 1
+            continue
+        if args.extract:
+            extract_dir = extract_package(zip_path, cache_root, refresh=args.refresh)
+            candidates = dir_tasks(extract_dir, dest_root / pkg["slug"], options)
+        else:
+            candidates = zip_tasks(zip_path, dest_root / pkg["slug"], options)
+
+        if not candidates:
+            print(f"Nenhuma musica encontrada em {zip_path}")
             continue
 
-        for song_dir in song_dirs:
-            song_name = song_dir.name
-            target = dest_root / pkg["slug"] / song_name
-            try:
-                import_song(
-                    source=song_dir,
-                    dest=target,
-                    ticks_per_beat=args.ticks_per_beat,
-                    include_freestyle=args.include_freestyle,
-                    relative=args.relative,
-                    audio_mode=args.audio_mode,
-                )
-                imported += 1
-            except Exception as exc:
-                print(f"Falha ao importar {song_dir}: {exc}")
-
-            if args.max_songs and imported >= args.max_songs:
-                break
-        if args.max_songs and imported >= args.max_songs:
-            break
-
-    print(f"Importacao finalizada. Musicas importadas: {imported}")
+        for task in candidates:
+            key = task.target.relative_to(dest_root).as_posix()
+            if task.error:
+                print(f"Falha ao ler {key}: {task.error}")
+                failed += 1
+                continue
+            if manifest.get(key) == task.digest and (task.target / "melody.csv").exists():
+                skipped += 1
+                continue
+            tasks.append(task)
+
+    if args.max_songs:
+        tasks = tasks[: args.max_songs]
+
+    imported = 0
+    try:
+        for task, error in run_imports(tasks, args.jobs):
+            key = task.target.relative_to(dest_root).as_posix()
+            if error:
+                print(f"Falha ao importar {key}: {error}")
+                manifest.pop(key, None)
+                failed += 1
+                continue
+            manifest[key] = task.digest
+            imported += 1
+    finally:
+        save_manifest(manifest_path, manifest)
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"Importacao finalizada em {elapsed:.1f}s. "
+        f"Importadas: {imported}, sem mudanca: {skipped}, falhas: {failed}"
+    )
     return 0
 
 
+def dir_tasks(root: Path, dest: Path, options: ImportOptions) -> List[ImportTask]:
+    tasks: List[ImportTask] = []
+    for song_dir in find_song_dirs(root):
+        task = ImportTask(target=dest / song_dir.name, options=options, source_dir=song_dir)
+        try:
+            texts = [(p.name, p.read_bytes()) for p in sorted(song_dir.glob("*.txt")) if p.is_file()]
+            task.digest = source_digest(texts, options)
+        except OSError as exc:
+            task.error = str(exc)
+        tasks.append(task)
+    return tasks
+
+
+def zip_tasks(zip_path: Path, dest: Path, options: ImportOptions) -> List[ImportTask]:
+    folders: Dict[PurePosixPath, Dict[str, str]] = {}
+    with zipfile.ZipFile(zip_path, "r") as archive:
+        for member in archive.infolist():
+            if member.is_dir():
+                continue
+            path = PurePosixPath(member.filename)
+            folders.setdefault(path.parent, {})[path.name.lower()] = member.filename
+
+        tasks: List[ImportTask] = []
+        for folder, files in sorted(folders.items()):
+            txts = sorted(name for lower, name in files.items() if lower.endswith(".txt"))
+            if not txts:
+                continue
+            name = folder.name
+            if name in ("", ".", ".."):
+                name = zip_path.stem
+            task = ImportTask(target=dest / name, options=options, zip_path=zip_path, files=files)
+            if len(txts) > 1:
+                task.error = "Mais de um .txt encontrado."
+            else:
+                task.txt_member = txts[0]
+                raw = archive.read(task.txt_member)
+                task.digest = source_digest([(PurePosixPath(task.txt_member).name, raw)], options)
+            tasks.append(task)
+    return tasks
+
+
+def source_digest(texts: List[Tuple[str, bytes]], options: ImportOptions) -> str:
+    digest = hashlib.sha256(json.dumps(asdict(options), sort_keys=True).encode("utf-8"))
+    for name, raw in texts:
+        digest.update(name.encode("utf-8"))
+        digest.update(raw)
+    return digest.hexdigest()
+
+
+def run_imports(tasks: List[ImportTask], jobs: int) -> Iterator[Tuple[ImportTask, Optional[str]]]:
+    jobs = jobs or os.cpu_count() or 1
+    jobs = max(1, min(jobs, len(tasks)))
+    if jobs == 1:
+        for task in tasks:
+            yield task, _import_task(task)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        yield from zip(tasks, pool.map(_import_task, tasks, chunksize=8))
+
+
+def _import_task(task: ImportTask) -> Optional[str]:
+    options = task.options
+    try:
+        if task.zip_path is not None:
+            import_zip_song(task)
+        else:
+            import_song(
+                source=task.source_dir,
+                dest=task.target,
+                ticks_per_beat=options.ticks_per_beat,
+                include_freestyle=options.include_freestyle,
+                relative=options.relative,
+                audio_mode=options.audio_mode,
+            )
+    except (OSError, zipfile.BadZipFile, UnicodeDecodeError, ValueError) as exc:
+        # So falhas do arquivo da musica; erro de programacao sobe e derruba a importacao.
+        return str(exc) or type(exc).__name__
+    return None
+
+
+def import_zip_song(task: ImportTask) -> None:
+    archive = _open_archive(task.zip_path)
+    options = task.options
+    headers = convert_song(
+        archive.read(task.txt_member),
+        task.target,
+        ticks_per_beat=options.ticks_per_beat,
+        include_freestyle=options.include_freestyle,
+        relative=options.relative,
+    )
+
+    audio_file = audio_filename(headers)
+    if not audio_file or options.audio_mode == "none":
+        return
+    member = task.files.get(PurePosixPath(audio_file.replace("\\", "/")).name.lower())
+    if member is None:
+        return
+    target = task.target / f"audio{PurePosixPath(member).suffix.lower()}"
+    if target.exists():
+        return
+    temp = target.with_name(target.name + ".part")
+    with archive.open(member) as source, temp.open("wb") as handle:
+        shutil.copyfileobj(source, handle, COPY_CHUNK)
+    os.replace(temp, target)
+
+
+def _open_archive(path: Path) -> zipfile.ZipFile:
+    # Cada processo reaproveita o indice do zip entre as musicas do mesmo pacote.
+    archive = _ARCHIVES.get(path)
+    if archive is None:
+        archive = zipfile.ZipFile(path, "r")
+        _ARCHIVES[path] = archive
+    return archive
+
+
+def load_manifest(path: Path) -> Dict[str, str]:
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path: Path, manifest: Dict[str, str]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_suffix(".tmp")
+    temp.write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    os.replace(temp, path)
+
+
 def fetch_packages() -> List[Dict[str, str]]:
     html = _fetch_text(PERFORMOUS_SONGS_URL)
 
@@ -130,14 +330,36 @@ def select_packages(packages: List[Dict[str, str]], names: Iterable[str], use_al
     return selected
 
 
-def download_package(pkg: Dict[str, str], cache_root: Path, refresh: bool) -> Path:
+def download_packages(
+    packages: List[Dict[str, str]],
+    cache_root: Path,
+    refresh: bool,
+    verify: bool,
+    connections: int,
+) -> Iterator[Tuple[Dict[str, str], Optional[Path]]]:
+    workers = max(1, min(connections, len(packages)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(download_package, pkg, cache_root, refresh, verify) for pkg in packages]
+        for pkg, future in zip(packages, futures):
+            try:
+                yield pkg, future.result()
+            except (OSError, ValueError) as exc:
+                print(f"Falha ao baixar {pkg['filename']}: {exc}")
+                yield pkg, None
+
+
+def download_package(pkg: Dict[str, str], cache_root: Path, refresh: bool, verify: bool = False) -> Path:
     zip_path = cache_root / pkg["filename"]
     if zip_path.exists() and not refresh:
         return zip_path
 
+    part = zip_path.with_name(zip_path.name + ".part")
+    if refresh and part.exists():
+        part.unlink()
     print(f"Baixando {pkg['filename']}...")
-    data = _fetch_bytes(pkg["url"])
-    zip_path.write_bytes(data)
+    _download(pkg["url"], part)
+    _check_zip(part, verify)
+    os.replace(part, zip_path)
     return zip_path
 
 
@@ -195,10 +417,58 @@ def _fetch_text(url: str) -> str:
         return response.read().decode("utf-8", errors="ignore")
 
 
-def _fetch_bytes(url: str) -> bytes:
-    request = urllib.request.Request(url, headers={"User-Agent": "KaraokeFetcher/1.0"})
-    with urllib.request.urlopen(request, timeout=60) as response:
-        return response.read()
+def _download(url: str, path: Path) -> None:
+    for attempt in range(1, DOWNLOAD_RETRIES + 1):
+        offset = path.stat().st_size if path.exists() else 0
+        headers = {"User-Agent": "KaraokeFetcher/1.0"}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                resumed = offset > 0 and response.status == 206
+                total = _expected_size(response, offset if resumed else 0)
+                with path.open("ab" if resumed else "wb") as handle:
+                    shutil.copyfileobj(response, handle, DOWNLOAD_CHUNK)
+            size = path.stat().st_size
+            if total is not None and size != total:
+                raise ConnectionError(f"download incompleto ({size} de {total} bytes)")
+            return
+        except urllib.error.HTTPError as exc:
+            if exc.code == 416 and offset:
+                # O servidor nao tem mais bytes: o .part ja esta completo.
+                return
+            if attempt == DOWNLOAD_RETRIES or exc.code < 500:
+                raise
+            print(f"Erro baixando {url}: {exc}. Tentando de novo...")
+        except OSError as exc:
+            if attempt == DOWNLOAD_RETRIES:
+                raise
+            print(f"Erro baixando {url}: {exc}. Retomando...")
+        time.sleep(attempt)
+
+
+def _expected_size(response, offset: int) -> Optional[int]:
+    content_range = response.headers.get("Content-Range")
+    if content_range and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1].strip()
+        if total.isdigit():
+            return int(total)
+    length = response.headers.get("Content-Length")
+    if length and length.isdigit():
+        return offset + int(length)
+    return None
+
+
+def _check_zip(path: Path, verify: bool) -> None:
+    try:
+        with zipfile.ZipFile(path, "r") as archive:
+            bad = archive.testzip() if verify else None
+    except zipfile.BadZipFile:
+        bad = path.name
+    if bad is not None:
+        path.unlink()
+        raise ValueError(f"Zip corrompido ({bad}); baixe de novo.")
 
 
 if __name__ == "__main__":
@@ -8,6 +8,8 @@ from pathlib import Path
 ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(ROOT / "src"))
 
+from karaoke.pcmcache import DEFAULT_ROOT, PcmCache  # noqa: E402
+from karaoke.song import Song  # noqa: E402
 from karaoke.ultrastar import import_song  # noqa: E402
 
 
@@ -20,6 +22,8 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--include-freestyle", action="store_true", help="Inclui notas 'F' na melodia")
     parser.add_argument("--relative", action="store_true", help="Trata timings como relativos a linha")
     parser.add_argument("--audio-mode", choices=["symlink", "copy", "none"], default="symlink")
+    parser.add_argument("--decode", action="store_true", help="Ja decodifica OGG/MP3 para o cache de WAV")
+    parser.add_argument("--pcm-cache", default=str(DEFAULT_ROOT), help="Pasta do cache de WAV")
     return parser.parse_args()
 
 
@@ -34,6 +38,9 @@ def main() -> int:
         relative=args.relative,
         audio_mode=args.audio_mode,
     )
+    if args.decode and args.audio_mode != "none":
+        song = Song.from_dir(Path(args.dest))
+        print(f"Audio decodificado: {PcmCache(Path(args.pcm_cache)).ensure(song.audio_path)}")
     print("Importacao concluida.")
     return 0
 